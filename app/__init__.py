@@ -3,11 +3,19 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
 from flask_migrate import Migrate
+from flask_mail import Mail
+from app.cache import ResponseCache, UserCache
+from app.metrics import Metrics
+from app.database import RoutingSession
 import os
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
+response_cache = ResponseCache()
+user_cache = UserCache()
+metrics = Metrics()
+mail = Mail()
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
@@ -16,10 +24,28 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     db.init_app(app)
+    from app.database import register_database
+    register_database(app)
+    # Before any extension adds request hooks, so its timers wrap them all
+    from app.profiling import register_profiling
+    register_profiling(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    response_cache.init_app(app)
+    user_cache.init_app(app)
+    metrics.init_app(app)
+    mail.init_app(app)
+
+    from app.assets import register_assets
+    register_assets(app)
 
     from app.routes import register_routes
     register_routes(app)
 
+    from app.api import register_api
+    register_api(app)
+
+    from app.commands import register_commands
+    register_commands(app)
+
     return app
@@ -0,0 +1,307 @@
+import hashlib
+import json
+from datetime import date, timedelta
+from flask import Blueprint, current_app, request, url_for, abort, make_response
+from flask_login import current_user
+from sqlalchemy.orm import joinedload, load_only
+from werkzeug.exceptions import HTTPException
+from app import db
+from app.models import Room, Booking, BookedDate
+from app.search import search_rooms
+from app.geo import filter_by_geo, distance_km
+from app.facets import available_on, cached_facet_counts, price_between
+from app.pagination import keyset_paginate
+from app.revenue import parse_period, owner_report
+from app.database import read_only
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MAX_LIMIT = 100
+AVAILABILITY_WINDOW = 90
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _image_url(room):
+    return url_for('static', filename=f'images/{room.image_filename}')
+
+
+# Every field a client may ask for with ?fields=, how to render it and the
+# columns it needs, so unrequested columns are not even loaded.
+ROOM_FIELDS = {
+    'id': (lambda room: room.id, ('id',)),
+    'title': (lambda room: room.title, ('title',)),
+    'location': (lambda room: room.location, ('location',)),
+    'latitude': (lambda room: room.latitude, ('latitude',)),
+    'longitude': (lambda room: room.longitude, ('longitude',)),
+    'rent_price': (lambda room: room.rent_price, ('rent_price',)),
+    'room_type': (lambda room: room.room_type, ('room_type',)),
+    'description': (lambda room: room.description, ('description',)),
+    'image': (_image_url, ('image_filename',)),
+    'available_from': (lambda room: _iso(room.available_from), ('available_from',)),
+    'available_to': (lambda room: _iso(room.available_to), ('available_to',)),
+    'status': (lambda room: room.status, ('status',)),
+    'owner_id': (lambda room: room.owner_id, ('owner_id',)),
+    'average_rating': (lambda room: round(room.average_rating(), 2), ('rating_sum', 'rating_count')),
+    'rating_count': (lambda room: room.rating_count, ('rating_count',)),
+    'created_at': (lambda room: _iso(room.created_at), ('created_at',)),
+    'updated_at': (lambda room: _iso(room.updated_at), ('updated_at',)),
+}
+ROOM_LIST_FIELDS = ('id', 'title', 'location', 'latitude', 'longitude', 'rent_price', 'room_type', 'image',
+                    'available_from', 'average_rating', 'rating_count', 'updated_at')
+
+BOOKING_FIELDS = {
+    'id': (lambda booking: booking.id, ('id',)),
+    'room_id': (lambda booking: booking.room_id, ('room_id',)),
+    'start_date': (lambda booking: _iso(booking.start_date), ('start_date',)),
+    'end_date': (lambda booking: _iso(booking.end_date), ('end_date',)),
+    'status': (lambda booking: booking.status, ('status',)),
+    'total_price': (lambda booking: booking.total_price, ('total_price',)),
+    'created_at': (lambda booking: _iso(booking.created_at), ('created_at',)),
+}
+
+
+def requested_fields(available, default):
+    """Field names from ?fields=a,b,c, or default when none were given"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        abort(400, description=f'Unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def only_columns(model, available, fields):
+    columns = {'id'}
+    for name in fields:
+        columns.update(available[name][1])
+    return load_only(*[getattr(model, column) for column in sorted(columns)])
+
+
+def serialize(obj, available, fields):
+    return {name: available[name][0](obj) for name in fields}
+
+
+def requested_limit():
+    limit = request.args.get('limit', type=int) or current_app.config['PAGE_SIZE']
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def requested_ids():
+    ids = []
+    for part in request.args.get('ids', '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit():
+            abort(400, description='ids must be a comma separated list of integers')
+        ids.append(int(part))
+    if len(ids) > MAX_LIMIT:
+        abort(400, description=f'At most {MAX_LIMIT} ids per request')
+    return ids
+
+
+def json_response(payload, last_modified=None):
+    """Compact JSON answering If-None-Match and If-Modified-Since with 304.
+
+    Only pass last_modified for a single row: a collection can change
+    (rows leaving it, a shifted page) without any row's updated_at moving.
+    """
+    body = json.dumps(payload, separators=(',', ':'), sort_keys=True)
+    response = make_response(body)
+    response.content_type = 'application/json'
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Responses can depend on the logged-in user
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def can_view(room):
+    if room.status == 'approved':
+        return True
+    return current_user.is_authenticated and (current_user.role == 'admin' or current_user.id == room.owner_id)
+
+
+@api.errorhandler(HTTPException)
+def json_error(error):
+    return make_response({'error': error.description}, error.code)
+
+
+@api.route('/rooms')
+@read_only
+def rooms():
+    """Approved rooms filtered like the /rooms page, or a batch by ?ids="""
+    fields = requested_fields(ROOM_FIELDS, ROOM_LIST_FIELDS)
+    # status and owner_id decide visibility
+    columns = fields + ['status', 'owner_id']
+    query = Room.query
+
+    ids = requested_ids()
+    if ids:
+        query = query.options(only_columns(Room, ROOM_FIELDS, columns))
+        found = {room.id: room for room in query.filter(Room.id.in_(ids))}
+        items = [found[room_id] for room_id in ids if room_id in found and can_view(found[room_id])]
+        return json_response({'data': [serialize(room, ROOM_FIELDS, fields) for room in items]})
+
+    location = request.args.get('location', '')
+    room_type = request.args.get('room_type', '')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    price_below = request.args.get('price_below', type=float)
+    available = request.args.get('available') == '1'
+
+    query = query.filter_by(status='approved')
+    sort_keys = [Room.created_at, Room.id]
+    if location:
+        query, score = search_rooms(query, location)
+        if score is not None:
+            sort_keys = [score, Room.id]
+
+    query, proximity, origin, error = filter_by_geo(query, request.args)
+    if error:
+        abort(400, description=error)
+    if proximity is not None:
+        sort_keys = [proximity, Room.id]
+        columns += ['latitude', 'longitude']
+
+    facets = None
+    if request.args.get('facets') == '1':
+        facets = cached_facet_counts(query, request.args, room_type=room_type, min_price=min_price,
+                                     max_price=max_price, price_below=price_below, available=available)
+    if room_type:
+        query = query.filter(Room.room_type == room_type)
+    query = query.filter(price_between(min_price, max_price, price_below))
+    if available:
+        query = query.filter(available_on(date.today()))
+    query = query.options(only_columns(Room, ROOM_FIELDS, columns))
+
+    page = keyset_paginate(query, sort_keys, after=request.args.get('after'),
+                           before=request.args.get('before'), per_page=requested_limit())
+    data = [serialize(room, ROOM_FIELDS, fields) for room in page.items]
+    if origin is not None:
+        for item, room in zip(data, page.items):
+            item['distance_km'] = round(distance_km(origin[0], origin[1], room.latitude, room.longitude), 2)
+    payload = {
+        'data': data,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+    if facets is not None:
+        payload['facets'] = facets
+    return json_response(payload)
+
+
+@api.route('/rooms/<int:room_id>')
+@read_only
+def room(room_id):
+    fields = requested_fields(ROOM_FIELDS, ROOM_FIELDS)
+    room = Room.query.options(joinedload(Room.owner)).filter_by(id=room_id).first()
+    if room is None or not can_view(room):
+        abort(404, description='Room not found')
+
+    payload = serialize(room, ROOM_FIELDS, fields)
+    if request.args.get('fields') is None:
+        payload['owner'] = {'id': room.owner.id, 'name': room.owner.name}
+    return json_response({'data': payload}, last_modified=room.updated_at)
+
+
+@api.route('/rooms/<int:room_id>/availability')
+@read_only
+def availability(room_id):
+    """Booked date ranges for a room between ?from= and ?to= (inclusive)"""
+    room = db.session.get(Room, room_id)
+    if room is None or not can_view(room):
+        abort(404, description='Room not found')
+
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        end = (date.fromisoformat(request.args['to']) if request.args.get('to')
+               else start + timedelta(days=AVAILABILITY_WINDOW))
+    except ValueError:
+        abort(400, description='from and to must be YYYY-MM-DD dates')
+    if end < start or (end - start).days > 366:
+        abort(400, description='The date range must be ascending and at most a year long')
+
+    days = [day for (day,) in db.session.query(BookedDate.day).filter(
+        BookedDate.room_id == room_id,
+        BookedDate.day >= start,
+        BookedDate.day <= end
+    ).order_by(BookedDate.day)]
+
+    # Collapse consecutive days into [first, last] ranges
+    booked = []
+    for day in days:
+        if booked and day - booked[-1][1] == timedelta(days=1):
+            booked[-1][1] = day
+        else:
+            booked.append([day, day])
+
+    return json_response({'data': {
+        'room_id': room_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'available_from': _iso(room.available_from),
+        'available_to': _iso(room.available_to),
+        'booked': [[first.isoformat(), last.isoformat()] for first, last in booked],
+    }})
+
+
+@api.route('/bookings')
+def bookings():
+    """The caller's own bookings, newest first"""
+    if not current_user.is_authenticated:
+        abort(401, description='Log in to see your bookings')
+
+    fields = requested_fields(BOOKING_FIELDS, BOOKING_FIELDS)
+    query = Booking.query.options(only_columns(Booking, BOOKING_FIELDS, fields)).filter(
+        Booking.renter_id == current_user.id
+    )
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Booking.status == status)
+
+    page = keyset_paginate(query, [Booking.created_at, Booking.id], after=request.args.get('after'),
+                           before=request.args.get('before'), per_page=requested_limit())
+    return json_response({
+        'data': [serialize(booking, BOOKING_FIELDS, fields) for booking in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+@api.route('/owner/analytics')
+def owner_analytics():
+    """Nights, revenue and occupancy of the caller's rooms, per room and month.
+
+    ?from= and ?to= are YYYY-MM months, inclusive; the default is the
+    last 12 months and the next 3.
+    """
+    if not current_user.is_authenticated:
+        abort(401, description='Log in to see your analytics')
+    if current_user.role != 'owner':
+        abort(403, description='Only room owners have analytics')
+    try:
+        first, last = parse_period(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    report = owner_report(current_user.id, first, last)
+    return json_response({'data': {
+        'from': first.strftime('%Y-%m'),
+        'to': last.strftime('%Y-%m'),
+        'total': report['total'],
+        'rooms': report['rooms'],
+        'months': [dict(month, month=month['month'].strftime('%Y-%m')) for month in report['months']],
+    }})
+
+
+def register_api(app):
+    app.register_blueprint(api)
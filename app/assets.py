@@ -0,0 +1,136 @@
+import glob
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_DIRS = ('css', 'js')
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+ASSET_REFERENCE = re.compile(r"asset_url\('([^']+)'\)")
+# Content-addressed uploads (and their resized variants) in static/images
+STORED_UPLOAD = re.compile(r'^images/[0-9a-f]{64}(_\d+)?\.[a-z0-9]+$')
+
+
+def fingerprinted_name(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.{digest}{extension}'
+
+
+def referenced_assets(template_folder):
+    """Static paths passed literally to asset_url() in any template"""
+    paths = set()
+    for template in glob.glob(os.path.join(template_folder, '**', '*.html'), recursive=True):
+        with open(template, encoding='utf-8') as f:
+            paths.update(ASSET_REFERENCE.findall(f.read()))
+    return paths
+
+
+def build_assets(app):
+    """Write fingerprinted, precompressed copies of static assets to static/dist.
+
+    Everything under css/ and js/ is included, plus any other static file
+    a template loads through asset_url(). Returns the manifest mapping
+    each logical path to its fingerprinted path.
+    """
+    static_folder = app.static_folder
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+
+    sources = referenced_assets(os.path.join(app.root_path, app.template_folder))
+    for directory in ASSET_DIRS:
+        for path in glob.glob(os.path.join(static_folder, directory, '**', '*'), recursive=True):
+            if os.path.isfile(path):
+                sources.add(os.path.relpath(path, static_folder).replace(os.sep, '/'))
+
+    manifest = {}
+    for logical in sorted(sources):
+        source_path = os.path.join(static_folder, logical)
+        if not os.path.isfile(source_path):
+            continue
+
+        with open(source_path, 'rb') as f:
+            content = f.read()
+        target = fingerprinted_name(logical, content)
+        target_path = os.path.join(dist_folder, target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, 'wb') as f:
+            f.write(content)
+
+        if os.path.splitext(logical)[1] in COMPRESSIBLE_EXTENSIONS:
+            with open(target_path + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target_path + '.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+
+        manifest[logical] = target
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(app):
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def register_assets(app):
+    app.extensions['asset_manifest'] = load_manifest(app)
+    dist_folder = os.path.join(app.static_folder, DIST_DIR)
+
+    @app.template_global()
+    def asset_url(path):
+        """URL of the fingerprinted copy of a static file, if one was built"""
+        target = app.extensions['asset_manifest'].get(path)
+        if target is None:
+            return url_for('static', filename=path)
+        return url_for('dist_asset', filename=target)
+
+    @app.route('/static/dist/<path:filename>')
+    def dist_asset(filename):
+        mimetype = mimetypes.guess_type(filename)[0]
+        accepted = request.accept_encodings
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.isfile(os.path.join(dist_folder, filename + suffix)):
+                response = send_from_directory(dist_folder, filename + suffix, mimetype=mimetype,
+                                               max_age=IMMUTABLE_MAX_AGE)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(dist_folder, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    @app.after_request
+    def cache_stored_uploads(response):
+        if request.endpoint == 'static' and response.status_code == 200:
+            filename = (request.view_args or {}).get('filename', '')
+            if STORED_UPLOAD.match(filename):
+                response.cache_control.public = True
+                response.cache_control.max_age = IMMUTABLE_MAX_AGE
+                response.cache_control.immutable = True
+        return response
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Booking, BookedDate
+
+
+class DatesUnavailable(Exception):
+    def __init__(self, conflict=None):
+        super().__init__('Room is already booked for some of these dates')
+        self.conflict = conflict
+
+
+def days_between(start_date, end_date):
+    """Every day a booking occupies, check-in and check-out included"""
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def find_conflict(room_id, start_date, end_date):
+    """Return a booking already holding any day in the range, or None"""
+    return Booking.query.join(BookedDate, BookedDate.booking_id == Booking.id).filter(
+        BookedDate.room_id == room_id,
+        BookedDate.day >= start_date,
+        BookedDate.day <= end_date
+    ).first()
+
+
+def conflict_message(conflict):
+    if conflict is None:
+        return 'Room already booked for some of these dates. Please choose different dates.'
+    start_str = conflict.start_date.strftime('%Y-%m-%d')
+    end_str = conflict.end_date.strftime('%Y-%m-%d')
+    return f'Room already booked from {start_str} to {end_str}. Please choose different dates.'
+
+
+def reserve_dates(booking):
+    """Claim the booking's days for its room in the current transaction.
+
+    Flushes the session. If another booking got any of the days first the
+    session is rolled back and DatesUnavailable is raised.
+    """
+    for day in days_between(booking.start_date, booking.end_date):
+        booking.booked_dates.append(BookedDate(room_id=booking.room_id, day=day))
+
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        raise DatesUnavailable(find_conflict(booking.room_id, booking.start_date, booking.end_date))
+
+
+def release_dates(booking):
+    """Free the booking's days once it is no longer pending or confirmed"""
+    BookedDate.query.filter_by(booking_id=booking.id).delete(synchronize_session=False)
+    db.session.expire(booking, ['booked_dates'])
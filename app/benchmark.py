@@ -0,0 +1,233 @@
+import http.cookiejar
+import json
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+from sqlalchemy import event, func, select
+from app import db, response_cache
+from app.models import User, Room, Booking
+from app.synthetic import PASSWORD, LOCATIONS, ROOM_TYPES
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+ROUTES = ('index', 'room_list', 'room_details', 'book_room', 'owner_bookings')
+# Served from the response cache when it is on; measured cold and warm
+CACHED_ROUTES = ('index', 'room_list', 'room_details')
+
+
+class TestClientDriver:
+    """Drives the app in-process and counts the SQL statements per request"""
+
+    can_clear_cache = True
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.queries = 0
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def close(self):
+        with self.app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', self._count)
+
+    def clear_cache(self):
+        with self.app.app_context():
+            response_cache.clear()
+
+    def csrf_data(self, path, data):
+        return data
+
+    def request(self, method, path, data=None):
+        self.queries = 0
+        # A fresh app context per request, as in production; otherwise
+        # requests reuse the caller's context along with its g and session
+        with self.app.app_context():
+            response = self.client.open(path, method=method, data=data)
+        return response.status_code, self.queries
+
+
+class HttpDriver:
+    """Drives a running server; query counts are not available, and its
+    response cache cannot be cleared, so cached routes are measured as
+    the server has them"""
+
+    can_clear_cache = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            NoRedirect()
+        )
+
+    def close(self):
+        pass
+
+    def clear_cache(self):
+        pass
+
+    def csrf_data(self, path, data):
+        with self.opener.open(self.base_url + path) as response:
+            match = CSRF_TOKEN.search(response.read().decode('utf-8', 'replace'))
+        return dict(data, csrf_token=match.group(1)) if match else data
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 400),
+        'throughput': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def scenario_data(seed):
+    """Ids and accounts the scenarios pick from, read once up front"""
+    rng = random.Random(seed)
+    room_ids = db.session.scalars(select(Room.id).where(Room.status == 'approved')).all()
+    viewer = db.session.scalars(select(User.email).where(User.role == 'viewer').order_by(User.id).limit(1)).first()
+    # The owner with the most bookings is the worst case for owner_bookings
+    owner = db.session.execute(
+        select(User.email).join(Room, Room.owner_id == User.id).join(Booking, Booking.room_id == Room.id)
+        .group_by(User.id).order_by(func.count(Booking.id).desc()).limit(1)
+    ).scalar()
+    if not room_ids or viewer is None or owner is None:
+        raise ValueError('Not enough data to benchmark; run flask data generate first')
+    return rng, room_ids, viewer, owner
+
+
+def run(driver, routes=ROUTES, requests=200, seed=1):
+    """Issue requests to each route and return per-route statistics.
+
+    When the driver can clear the response cache, each of CACHED_ROUTES
+    is measured twice: as route with the cache cleared before every
+    request, so the numbers are the app's own work, and as route_warm
+    with the cache left alone.
+    """
+    rng, room_ids, viewer, owner = scenario_data(seed)
+    results = {}
+
+    def log_in(email):
+        driver.request('GET', '/logout')
+        data = driver.csrf_data('/login', {'email': email, 'password': PASSWORD})
+        driver.request('POST', '/login', data)
+
+    def measure(route, make_request):
+        if route in CACHED_ROUTES and driver.can_clear_cache:
+            measure_once(route, make_request, cold=True)
+            route += '_warm'
+        measure_once(route, make_request)
+
+    def measure_once(route, make_request, cold=False):
+        samples = []
+        clearing = 0.0
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, path, data = make_request()
+            if data is not None:
+                data = driver.csrf_data(path, data)
+            if cold:
+                before = time.perf_counter()
+                driver.clear_cache()
+                clearing += time.perf_counter() - before
+            before = time.perf_counter()
+            status, queries = driver.request(method, path, data)
+            samples.append((time.perf_counter() - before, status, queries))
+        results[route] = summarize(samples, time.perf_counter() - started - clearing)
+
+    def room_list_request():
+        params = {'location': rng.choice(LOCATIONS).split(',')[0]}
+        if rng.random() < 0.5:
+            params['room_type'] = rng.choice(list(ROOM_TYPES))
+        if rng.random() < 0.5:
+            params['max_price'] = rng.choice((8000, 15000, 30000))
+        return 'GET', '/rooms?' + urllib.parse.urlencode(params), None
+
+    def book_room_request():
+        start = date.today() + timedelta(days=rng.randrange(1, 365))
+        end = start + timedelta(days=rng.choice((1, 3, 7)))
+        return 'POST', f'/book/{rng.choice(room_ids)}', {
+            'start_date': start.isoformat(), 'end_date': end.isoformat()
+        }
+
+    if 'index' in routes:
+        driver.request('GET', '/logout')
+        measure('index', lambda: ('GET', '/', None))
+    if 'room_list' in routes:
+        measure('room_list', room_list_request)
+    if 'room_details' in routes:
+        measure('room_details', lambda: ('GET', f'/room/{rng.choice(room_ids)}', None))
+    if 'book_room' in routes:
+        log_in(viewer)
+        measure('book_room', book_room_request)
+    if 'owner_bookings' in routes:
+        log_in(owner)
+        measure('owner_bookings', lambda: ('GET', '/owner/bookings', None))
+    driver.request('GET', '/logout')
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against a saved baseline, as readable lines.
+
+    Latency may grow by tolerance (a fraction) before it counts; any
+    increase in queries per request counts.
+    """
+    regressions = []
+    for route, current in results.items():
+        previous = baseline.get(route)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{route}: {metric} {previous[metric]} -> {current[metric]}')
+        if previous.get('queries') is not None and current.get('queries') is not None \
+                and current['queries'] > previous['queries']:
+            regressions.append(f'{route}: queries {previous["queries"]} -> {current["queries"]}')
+        if current['errors'] > previous['errors']:
+            regressions.append(f'{route}: errors {previous["errors"]} -> {current["errors"]}')
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
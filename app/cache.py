@@ -0,0 +1,329 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, session, make_response
+from flask_login import current_user
+from sqlalchemy import DateTime
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class CacheEntry:
+    def __init__(self, body, content_type, etag, tags, expires):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.tags = tags
+        self.expires = expires
+
+
+class MemoryBackend:
+    """Per-process LRU bounded by both entry count and total body size"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if len(entry.body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.size += len(entry.body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if tags & entry.tags]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= len(entry.body)
+
+
+class SQLiteBackend:
+    """Cache shared by every worker process through one SQLite file.
+
+    Bounded by entry count; when full the entries stored longest ago are
+    dropped first.
+    """
+
+    def __init__(self, path, max_entries, table='response_cache'):
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, tags TEXT NOT NULL, etag TEXT NOT NULL, content_type TEXT NOT NULL, '
+                'body BLOB NOT NULL, expires REAL NOT NULL, stored REAL NOT NULL)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_stored ON {table} (stored)')
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            f'SELECT body, content_type, etag, tags, expires FROM {self.table} WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[4] < time.time():
+            return None
+        return CacheEntry(row[0], row[1], row[2], set(row[3].strip(',').split(',')), row[4])
+
+    def set(self, key, entry):
+        with self._connect() as conn:
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, tags, etag, content_type, body, expires, stored) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, ',' + ','.join(sorted(entry.tags)) + ',', entry.etag, entry.content_type,
+                 entry.body, entry.expires, time.time())
+            )
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM {self.table} ORDER BY stored DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def invalidate(self, tags):
+        with self._connect() as conn:
+            for tag in tags:
+                conn.execute(f"DELETE FROM {self.table} WHERE tags LIKE ? ESCAPE '\\'",
+                             ('%,' + tag.replace('%', '\\%').replace('_', '\\_') + ',%',))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table}')
+
+
+class ResponseCache:
+    """Caches rendered public pages for anonymous visitors.
+
+    Entries are tagged with what they were built from (e.g. 'rooms',
+    'room:5') so handlers that change that data can drop exactly the
+    pages it appears on. Every cacheable response also gets an ETag and
+    answers If-None-Match with 304.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def init_app(self, app):
+        backend = app.config['RESPONSE_CACHE']
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+                                         app.config['RESPONSE_CACHE_MAX_BYTES'])
+        elif backend == 'sqlite':
+            path = app.config['RESPONSE_CACHE_PATH'] or os.path.join(app.instance_path, 'response_cache.db')
+            self.backend = SQLiteBackend(path, app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        else:
+            self.backend = None
+        app.extensions['response_cache'] = self
+
+    @staticmethod
+    def cache_key():
+        args = sorted((name, value) for name, value in request.args.items(multi=True) if value)
+        return f'{request.path}?{urlencode(args)}'
+
+    def is_cacheable_request(self):
+        return (
+            self.backend is not None
+            and request.method in ('GET', 'HEAD')
+            and not current_user.is_authenticated
+            and '_flashes' not in session
+        )
+
+    def cached(self, tags=()):
+        """Decorate a view whose output depends only on the URL and tags.
+
+        tags is a tuple of tag names or a callable taking the view's
+        keyword arguments and returning one.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self.is_cacheable_request():
+                    return view(**kwargs)
+
+                key = self.cache_key()
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    response = make_response(entry.body)
+                    response.content_type = entry.content_type
+                    response.set_etag(entry.etag)
+                    return response.make_conditional(request)
+
+                self.misses += 1
+                response = make_response(view(**kwargs))
+                if response.status_code != 200 or response.direct_passthrough or '_flashes' in session:
+                    return response
+
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                entry_tags = set(tags(**kwargs) if callable(tags) else tags)
+                self.backend.set(key, CacheEntry(body, response.content_type, etag, entry_tags,
+                                                 time.time() + self.ttl))
+                response.set_etag(etag)
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+    def memoize(self, key, build, tags=()):
+        """Return build(), a JSON-serialisable value, cached under key.
+
+        For parts of a page that are worth sharing between requests the
+        page cache itself cannot serve, e.g. logged-in visitors. The value
+        comes back as decoded JSON, so tuples return as lists.
+        """
+        if self.backend is None:
+            return build()
+        entry = self.backend.get(key)
+        if entry is not None:
+            return json.loads(entry.body)
+        value = build()
+        self.backend.set(key, CacheEntry(json.dumps(value).encode(), 'application/json', '', set(tags),
+                                         time.time() + self.ttl))
+        return value
+
+    def invalidate(self, *tags):
+        if self.backend is not None:
+            self.backend.invalidate(tags)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+class UserCache:
+    """Column values of recently seen users, so the login loader can skip
+    the users query.
+
+    Cached values are turned back into a session-attached instance without
+    touching the database. Columns in EXCLUDED are never cached; they are
+    left unloaded and fetched on first access, so the password hash never
+    leaves the database and counters maintained by SQL stay exact.
+    """
+
+    EXCLUDED = {'password_hash', 'pending_bookings_count'}
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def init_app(self, app):
+        backend = app.config['USER_CACHE']
+        self.ttl = app.config['USER_CACHE_TTL']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['USER_CACHE_MAX_ENTRIES'], 16 * 1024 * 1024)
+        elif backend == 'sqlite':
+            path = app.config['USER_CACHE_PATH'] or os.path.join(app.instance_path, 'user_cache.db')
+            self.backend = SQLiteBackend(path, app.config['USER_CACHE_MAX_ENTRIES'], table='user_cache')
+        else:
+            self.backend = None
+        app.extensions['user_cache'] = self
+
+    @staticmethod
+    def key(user_id):
+        return f'user:{user_id}'
+
+    def load(self, session, model, user_id):
+        """Return the user with user_id attached to session, or None"""
+        if self.backend is None:
+            return session.get(model, user_id)
+
+        entry = self.backend.get(self.key(user_id))
+        if entry is not None:
+            self.hits += 1
+            values = json.loads(entry.body)
+            columns = model.__table__.columns
+            for name, value in values.items():
+                if value is not None and isinstance(columns[name].type, DateTime):
+                    values[name] = datetime.fromisoformat(value)
+            user = model(**values)
+            make_transient_to_detached(user)
+            return session.merge(user, load=False)
+
+        self.misses += 1
+        user = session.get(model, user_id)
+        if user is not None:
+            self.store(user)
+        return user
+
+    def store(self, user):
+        values = {}
+        for column in user.__table__.columns:
+            if column.key in self.EXCLUDED:
+                continue
+            value = getattr(user, column.key)
+            values[column.key] = value.isoformat() if isinstance(value, datetime) else value
+        key = self.key(user.id)
+        self.backend.set(key, CacheEntry(json.dumps(values).encode(), 'application/json', '', {key},
+                                         time.time() + self.ttl))
+
+    def invalidate(self, *user_ids):
+        if self.backend is not None:
+            self.backend.invalidate([self.key(user_id) for user_id in user_ids])
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
@@ -0,0 +1,497 @@
+import csv
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import db, response_cache
+from app.models import Room, User, Booking, Job
+from app.images import (ROOM_WIDTHS, ROOM_FALLBACK_WIDTH, AVATAR_WIDTHS, AVATAR_FALLBACK_WIDTH,
+                        PROCESSED_EXTENSIONS, render_variants)
+from app.assets import DIST_DIR, build_assets
+from app.forms import RoomForm
+from app.search import index_new_rooms
+from app.geo import load_gazetteer, lookup_place, resolve_coordinates, index_new_room_locations
+from app import benchmark, jobs, revenue, stats, synthetic
+from app.uploads import (STORED_NAME, DEFAULT_IMAGES, upload_folder, upload_lock, file_extension, hash_file,
+                         stored_name, remove_with_variants)
+
+uploads_cli = AppGroup('uploads', help='Manage uploaded images.')
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+bookings_cli = AppGroup('bookings', help='Maintain booking bookkeeping.')
+passwords_cli = AppGroup('passwords', help='Tune password hashing.')
+rooms_cli = AppGroup('rooms', help='Import and export room listings.')
+data_cli = AppGroup('data', help='Generate synthetic data.')
+bench_cli = AppGroup('bench', help='Benchmark routes.')
+stats_cli = AppGroup('stats', help='Maintain the admin statistics.')
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@uploads_cli.command('dedupe')
+@click.option('--dry-run', is_flag=True, help='Report what would change without touching anything.')
+def dedupe_uploads(dry_run):
+    """Move referenced legacy uploads to content-addressed names.
+
+    Identical files collapse into one, rooms and users are repointed at
+    it and their image variants are regenerated under the new name.
+    """
+    folder = upload_folder()
+    referenced = {name for (name,) in db.session.query(Room.image_filename).distinct()}
+    referenced |= {name for (name,) in db.session.query(User.profile_image).distinct()}
+
+    moved = removed = missing = 0
+    candidates = (name for name in referenced
+                  if name and name not in DEFAULT_IMAGES and not STORED_NAME.match(name))
+    for filename in sorted(candidates):
+        path = os.path.join(folder, filename)
+        if not os.path.isfile(path):
+            missing += 1
+            continue
+
+        new_name = stored_name(hash_file(path), file_extension(filename))
+        new_path = os.path.join(folder, new_name)
+        duplicate = os.path.exists(new_path)
+        click.echo(f'{filename} -> {new_name}{" (duplicate)" if duplicate else ""}')
+        if dry_run:
+            continue
+
+        with upload_lock():
+            if not duplicate:
+                # Copied, so the old name still works if the commit below fails
+                temp_path = os.path.join(folder, f'.upload-{new_name}')
+                shutil.copy2(path, temp_path)
+                os.replace(temp_path, new_path)
+            processed = file_extension(new_name) in PROCESSED_EXTENSIONS
+
+            rooms = Room.query.filter_by(image_filename=filename)
+            if rooms.count():
+                variants = render_variants(new_path, ROOM_WIDTHS, ROOM_FALLBACK_WIDTH) if processed else None
+                rooms.update({'image_filename': new_name, 'image_variants': variants}, synchronize_session=False)
+
+            users = User.query.filter_by(profile_image=filename)
+            if users.count():
+                variants = render_variants(new_path, AVATAR_WIDTHS, AVATAR_FALLBACK_WIDTH) if processed else None
+                users.update({'profile_image': new_name, 'profile_image_variants': variants}, synchronize_session=False)
+
+            db.session.commit()
+
+        # Only once nothing points at the old name any more
+        remove_with_variants(folder, filename)
+        if duplicate:
+            removed += 1
+        else:
+            moved += 1
+
+    click.echo(f'{moved} renamed, {removed} duplicates removed, {missing} referenced files missing')
+
+
+@assets_cli.command('build')
+def build_static_assets():
+    """Fingerprint and precompress static assets into static/dist"""
+    manifest = build_assets(current_app)
+    current_app.extensions['asset_manifest'] = manifest
+    click.echo(f'{len(manifest)} assets written to static/{DIST_DIR}')
+
+
+@bookings_cli.command('reconcile-counters')
+def reconcile_pending_counters():
+    """Recount every owner's pending bookings and repair any drift"""
+    actual = dict(
+        db.session.query(Room.owner_id, db.func.count(Booking.id))
+        .join(Booking, Booking.room_id == Room.id)
+        .filter(Booking.status == 'pending')
+        .group_by(Room.owner_id)
+    )
+
+    repaired = 0
+    for user_id, stored in db.session.query(User.id, User.pending_bookings_count):
+        expected = actual.get(user_id, 0)
+        if stored != expected:
+            User.query.filter_by(id=user_id).update({'pending_bookings_count': expected}, synchronize_session=False)
+            click.echo(f'user {user_id}: {stored} -> {expected}')
+            repaired += 1
+
+    db.session.commit()
+    click.echo(f'{repaired} counters repaired')
+
+
+@bookings_cli.command('rollup')
+@click.option('--batch-size', default=1000, show_default=True, help='Bookings read per query.')
+def rollup_bookings(batch_size):
+    """Rebuild the per-room monthly nights and revenue from confirmed bookings.
+
+    The rollups are kept up to date as bookings change; run this once
+    for existing bookings, after writing bookings outside the app or if
+    the owner analytics look wrong.
+    """
+    started = time.perf_counter()
+    count = revenue.rebuild(batch_size=batch_size)
+    db.session.commit()
+    click.echo(f'{count} confirmed bookings rolled up in {time.perf_counter() - started:.1f}s')
+
+
+BENCHMARK_METHODS = ('pbkdf2:sha256:260000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1')
+
+
+@passwords_cli.command('benchmark')
+@click.option('--method', 'methods', multiple=True,
+              help='Hash method to measure; repeatable. Defaults to common settings plus the configured one.')
+@click.option('--seconds', default=3.0, show_default=True, help='How long to measure each method.')
+@click.option('--threads', type=int, help='Concurrent verifiers (default: one per core).')
+def benchmark_passwords(methods, seconds, threads):
+    """Measure password verifications (logins) per second at each setting"""
+    cores = os.cpu_count() or 1
+    threads = threads or cores
+    configured = current_app.config['PASSWORD_HASH_METHOD']
+    methods = methods or tuple(dict.fromkeys(BENCHMARK_METHODS + (configured,)))
+
+    def verify_until(pwhash, deadline):
+        count = 0
+        while time.perf_counter() < deadline:
+            check_password_hash(pwhash, 'correct horse battery staple')
+            count += 1
+        return count
+
+    click.echo(f'{threads} threads on {cores} cores, {seconds:g}s per method')
+    click.echo(f'{"method":<28}{"ms/login":>10}{"logins/s":>12}{"per core":>10}')
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for method in methods:
+            pwhash = generate_password_hash('correct horse battery staple', method)
+            start = time.perf_counter()
+            check_password_hash(pwhash, 'correct horse battery staple')
+            single_ms = (time.perf_counter() - start) * 1000
+
+            deadline = time.perf_counter() + seconds
+            start = time.perf_counter()
+            total = sum(pool.map(verify_until, [pwhash] * threads, [deadline] * threads))
+            rate = total / (time.perf_counter() - start)
+            marker = ' *' if method == configured else ''
+            click.echo(f'{method + marker:<28}{single_ms:>10.1f}{rate:>12.1f}{rate / cores:>10.1f}')
+    click.echo('* currently configured (PASSWORD_HASH_METHOD)')
+
+
+ROOM_EXPORT_COLUMNS = ('id', 'owner_email', 'title', 'location', 'latitude', 'longitude', 'rent_price', 'room_type',
+                       'description', 'available_from', 'available_to', 'status', 'created_at')
+ROOM_FORM_FIELDS = ('title', 'location', 'latitude', 'longitude', 'rent_price', 'room_type', 'description',
+                    'available_from', 'available_to')
+
+
+def file_format(file, given):
+    if given:
+        return given
+    return 'jsonl' if file.name.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(file, fmt):
+    """Yield (line number, row dict or None if unparseable) one at a time"""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def validate_room_row(row):
+    """Check a row with RoomForm's rules; return (values, errors)"""
+    # Blank cells are left out, exactly as a browser omits an empty optional field
+    formdata = MultiDict({
+        name: str(row[name]).strip() for name in ROOM_FORM_FIELDS
+        if row.get(name) is not None and str(row[name]).strip()
+    })
+    form = RoomForm(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    return {name: form[name].data for name in ROOM_FORM_FIELDS}, None
+
+
+@rooms_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Input format (default: from the file extension, else csv).')
+@click.option('--owner', 'default_owner', help='Email of the owner for rows without an owner_email column.')
+@click.option('--status', type=click.Choice(['pending', 'approved']), default='pending', show_default=True,
+              help='Status given to imported rooms.')
+@click.option('--batch-size', default=500, show_default=True, help='Rooms inserted per transaction.')
+def import_rooms(source, fmt, default_owner, status, batch_size):
+    """Bulk-insert rooms from a CSV or JSON Lines file ('-' for stdin).
+
+    Each row is validated like the add room form. Invalid rows are
+    reported and skipped; the rest are inserted in batches. Rows without
+    latitude and longitude are placed by their location name.
+    """
+    fmt = file_format(source, fmt)
+    owners = {}
+    batch = []
+    imported = failed = 0
+
+    def owner_id(email):
+        if email not in owners:
+            user = User.query.filter_by(email=email).first()
+            owners[email] = user.id if user is not None and user.role == 'owner' else None
+        return owners[email]
+
+    def flush():
+        if not batch:
+            return
+        inserted = db.session.execute(
+            insert(Room).returning(Room.id, Room.title, Room.location, Room.description, Room.status,
+                                   Room.latitude, Room.longitude, Room.created_at),
+            batch
+        ).mappings().all()
+        # Bulk inserts skip the mapper events that maintain the search indexes and stats
+        index_new_rooms(db.session.connection(), inserted)
+        index_new_room_locations(db.session.connection(), inserted)
+        stats.record_new_rows(db.session.connection(), Room, inserted)
+        db.session.commit()
+        batch.clear()
+
+    for line_number, row in read_rows(source, fmt):
+        if row is None:
+            click.echo(f'line {line_number}: not a valid row', err=True)
+            failed += 1
+            continue
+
+        values, errors = validate_room_row(row)
+        email = (row.get('owner_email') or default_owner or '').strip()
+        owner = owner_id(email) if email else None
+        if owner is None:
+            errors = dict(errors or {})
+            errors['owner_email'] = [f'No owner account for {email!r}' if email else 'No owner given']
+        if errors:
+            details = '; '.join(f'{name}: {" ".join(messages)}' for name, messages in errors.items())
+            click.echo(f'line {line_number}: {details}', err=True)
+            failed += 1
+            continue
+
+        values['latitude'], values['longitude'] = resolve_coordinates(
+            values['location'], values['latitude'], values['longitude']
+        )
+        values.update(owner_id=owner, status=status)
+        batch.append(values)
+        imported += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    if imported:
+        response_cache.invalidate('rooms')
+    click.echo(f'{imported} rooms imported, {failed} rows rejected')
+
+
+@rooms_cli.command('export')
+@click.argument('destination', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Output format (default: from the file extension, else csv).')
+@click.option('--status', type=click.Choice(['pending', 'approved', 'rejected']), help='Only export rooms with this status.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched from the database at a time.')
+def export_rooms(destination, fmt, status, batch_size):
+    """Stream rooms to a CSV or JSON Lines file ('-' for stdout)"""
+    fmt = file_format(destination, fmt)
+    query = select(
+        Room.id, User.email.label('owner_email'), Room.title, Room.location, Room.latitude, Room.longitude,
+        Room.rent_price, Room.room_type, Room.description, Room.available_from, Room.available_to, Room.status,
+        Room.created_at
+    ).join(User, User.id == Room.owner_id).order_by(Room.id)
+    if status:
+        query = query.filter(Room.status == status)
+
+    if fmt == 'csv':
+        writer = csv.DictWriter(destination, fieldnames=ROOM_EXPORT_COLUMNS)
+        writer.writeheader()
+
+    # Plain rows through a server-side cursor, so memory does not grow with the table
+    result = db.session.execute(query.execution_options(yield_per=batch_size)).mappings()
+    count = 0
+    for row in result:
+        row = {name: value.isoformat() if hasattr(value, 'isoformat') else value for name, value in row.items()}
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            destination.write(json.dumps(row) + '\n')
+        count += 1
+
+    click.echo(f'{count} rooms exported', err=True)
+
+
+@rooms_cli.command('geocode')
+@click.option('--gazetteer', 'gazetteer_path', type=click.Path(exists=True, dir_okay=False),
+              help='CSV of name,latitude,longitude to use instead of the bundled one.')
+@click.option('--all', 'redo', is_flag=True, help='Also re-place rooms that already have coordinates.')
+@click.option('--batch-size', default=500, show_default=True, help='Rooms updated per transaction.')
+def geocode_rooms(gazetteer_path, redo, batch_size):
+    """Fill in room coordinates from their location names"""
+    gazetteer = load_gazetteer(gazetteer_path)
+    query = Room.query.order_by(Room.id)
+    if not redo:
+        query = query.filter(db.or_(Room.latitude.is_(None), Room.longitude.is_(None)))
+
+    placed = unknown = 0
+    last_id = 0
+    while True:
+        rooms = query.filter(Room.id > last_id).limit(batch_size).all()
+        if not rooms:
+            break
+        for room in rooms:
+            coordinates = lookup_place(room.location, gazetteer)
+            if coordinates is None:
+                unknown += 1
+                continue
+            # Through the ORM so the mapper events keep rooms_rtree in step
+            room.latitude, room.longitude = coordinates
+            placed += 1
+        last_id = rooms[-1].id
+        db.session.commit()
+
+    if placed:
+        response_cache.invalidate('rooms')
+    click.echo(f'{placed} rooms placed, {unknown} locations not in the gazetteer')
+
+
+@data_cli.command('generate')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--rooms', default=2000, show_default=True)
+@click.option('--bookings', default=10000, show_default=True)
+@click.option('--reviews', default=4000, show_default=True)
+@click.option('--seed', default=42, show_default=True, help='Same seed, same data.')
+def generate_data(users, rooms, bookings, reviews, seed):
+    """Add synthetic users, rooms, bookings and reviews.
+
+    Every generated account's password is 'password123'.
+    """
+    started = time.perf_counter()
+    counts = synthetic.generate(users=users, rooms=rooms, bookings=bookings, reviews=reviews, seed=seed)
+    response_cache.clear()
+    summary = ', '.join(f'{count} {table}' for table, count in counts.items())
+    click.echo(f'Added {summary} in {time.perf_counter() - started:.1f}s')
+
+
+@bench_cli.command('run')
+@click.option('--url', help='Benchmark a running server instead of the in-process test client.')
+@click.option('--requests', 'count', default=200, show_default=True, help='Requests per route.')
+@click.option('--route', 'routes', multiple=True, type=click.Choice(benchmark.ROUTES),
+              help='Route to benchmark; repeatable. Defaults to all.')
+@click.option('--seed', default=1, show_default=True)
+@click.option('--save', 'save_path', help='Write the results to this file as a baseline.')
+@click.option('--compare', 'baseline_path', help='Fail if results regressed against this baseline.')
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed latency growth over the baseline.')
+def run_benchmark(url, count, routes, seed, save_path, baseline_path, tolerance):
+    """Measure throughput, latency percentiles and queries per request.
+
+    book_room creates real bookings, so run this against a generated
+    database rather than production data.
+    """
+    if url:
+        driver = benchmark.HttpDriver(url)
+    else:
+        current_app.config['WTF_CSRF_ENABLED'] = False
+        driver = benchmark.TestClientDriver(current_app)
+
+    try:
+        results = benchmark.run(driver, routes=routes or benchmark.ROUTES, requests=count, seed=seed)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        driver.close()
+
+    click.echo(f'{"route":<20}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"errors":>8}')
+    for route, stats in results.items():
+        queries = '-' if stats['queries'] is None else f'{stats["queries"]:g}'
+        click.echo(f'{route:<20}{stats["throughput"]:>9}{stats["p50_ms"]:>9}{stats["p95_ms"]:>9}'
+                   f'{stats["p99_ms"]:>9}{queries:>9}{stats["errors"]:>8}')
+
+    if save_path:
+        benchmark.save_baseline(save_path, results)
+        click.echo(f'Baseline saved to {save_path}')
+
+    if baseline_path:
+        regressions = benchmark.compare(results, benchmark.load_baseline(baseline_path), tolerance)
+        for line in regressions:
+            click.echo(f'REGRESSION {line}', err=True)
+        if regressions:
+            raise SystemExit(1)
+        click.echo('No regressions against the baseline')
+
+
+@stats_cli.command('rebuild')
+def rebuild_stats():
+    """Recount the admin statistics from the base tables.
+
+    The counters are kept up to date as rows change; run this after
+    writing rows outside the app or if the numbers look wrong.
+    """
+    stats.rebuild()
+    db.session.commit()
+    for prefix, values in stats.counters().items():
+        details = ', '.join(f'{key} {value}' for key, value in sorted(values.items()) if key != 'total')
+        click.echo(f'{prefix}: {values["total"]} ({details})')
+
+
+@jobs_cli.command('worker')
+@click.option('--processes', default=1, show_default=True, help='Worker processes to fork.')
+@click.option('--burst', is_flag=True, help='Exit once no jobs are due instead of waiting for more.')
+@click.option('--poll-interval', type=float, help='Seconds between checks when idle. Defaults to JOB_POLL_INTERVAL.')
+def run_job_worker(processes, burst, poll_interval):
+    """Run queued jobs such as notification emails.
+
+    Stops after the job in progress on SIGTERM or Ctrl+C.
+    """
+    app = current_app._get_current_object()
+    processed = jobs.run_workers(app, processes=processes, burst=burst, poll_interval=poll_interval)
+    if processed is not None:
+        click.echo(f'{processed} jobs run')
+
+
+@jobs_cli.command('status')
+def job_status():
+    """Count jobs by status and show how far behind the queue is."""
+    counts, lag = jobs.queue_status()
+    for status in ('queued', 'running', 'done', 'failed'):
+        click.echo(f'{status:<8}{counts.get(status, 0):>8}')
+    click.echo(f'Oldest due job waiting {lag:.0f}s')
+    for job in db.session.scalars(
+        select(Job).where(Job.status == 'failed').order_by(Job.finished_at.desc()).limit(10)
+    ):
+        error = (job.last_error or '').strip().splitlines()[-1:] or ['']
+        click.echo(f'failed #{job.id} {job.name} after {job.attempts} attempts: {error[0]}')
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+def retry_jobs(job_ids):
+    """Queue failed jobs again, all of them unless ids are given."""
+    click.echo(f'{jobs.requeue_failed(job_ids)} jobs queued again')
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=7, show_default=True, help='Keep jobs that finished more recently than this.')
+def purge_jobs(days):
+    """Delete finished and failed jobs older than --days."""
+    count = jobs.purge(datetime.utcnow() - timedelta(days=days))
+    click.echo(f'{count} jobs deleted')
+
+
+def register_commands(app):
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(bookings_cli)
+    app.cli.add_command(passwords_cli)
+    app.cli.add_command(rooms_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(bench_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(jobs_cli)
@@ -0,0 +1,69 @@
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Sends reads to the replica engine inside read_only views.
+
+    Flushes always go to the primary, so a read-only view that writes
+    anyway still writes to the right database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and has_app_context()
+            and g.get('read_replica')
+            and REPLICA_BIND in self._db.engines
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Run a view's queries against the read replica when one is configured.
+
+    Only for views that never write; the replica may lag the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.read_replica = False
+    return wrapper
+
+
+def sqlite_pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_pragmas
+
+
+def register_database(app):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection.
+
+    The replica is opened query-only, and its journal mode is left to
+    whatever keeps it in sync with the primary.
+    """
+    from app import db
+
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            engine_pragmas = dict(pragmas)
+            if key == REPLICA_BIND:
+                engine_pragmas.pop('journal_mode', None)
+                engine_pragmas['query_only'] = 1
+            event.listen(engine, 'connect', sqlite_pragma_listener(engine_pragmas))
@@ -0,0 +1,112 @@
+from datetime import date
+from urllib.parse import urlencode
+from sqlalchemy import and_, case, exists, func, or_, true
+from app import response_cache
+from app.models import Room, BookedDate
+
+# Edges of the rent histogram, in Rs; the first and last buckets are open-ended
+PRICE_EDGES = (5000, 10000, 15000, 20000, 30000)
+# Request args that change which rooms match; paging args do not
+FILTER_ARGS = ('location', 'room_type', 'min_price', 'max_price', 'price_below', 'available',
+               'near', 'lat', 'lng', 'radius_km', 'bbox')
+
+
+def price_ranges():
+    """(min, max) of each histogram bucket, None where open-ended"""
+    edges = (None,) + PRICE_EDGES + (None,)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def price_between(min_price, max_price, price_below=None):
+    """The /rooms price filter as an expression.
+
+    min_price and max_price are inclusive, as typed into the form;
+    price_below is exclusive and is what the histogram links send, so a
+    bucket returns exactly the rooms it counts.
+    """
+    conditions = []
+    if min_price:
+        conditions.append(Room.rent_price >= min_price)
+    if max_price:
+        conditions.append(Room.rent_price <= max_price)
+    if price_below:
+        conditions.append(Room.rent_price < price_below)
+    return and_(*conditions) if conditions else true()
+
+
+def in_bucket(low, high):
+    """A histogram bucket, half-open so a rent on an edge is counted once.
+
+    Matches price_between(low, None, high), the filter its link applies.
+    """
+    conditions = []
+    if low is not None:
+        conditions.append(Room.rent_price >= low)
+    if high is not None:
+        conditions.append(Room.rent_price < high)
+    return and_(*conditions) if conditions else true()
+
+
+def available_on(day):
+    """Rooms open for day and not held by a booking on it"""
+    return and_(
+        or_(Room.available_from.is_(None), Room.available_from <= day),
+        or_(Room.available_to.is_(None), Room.available_to >= day),
+        ~exists().where(BookedDate.room_id == Room.id, BookedDate.day == day),
+    )
+
+
+def facet_counts(query, room_type=None, min_price=None, max_price=None, price_below=None, available=False,
+                 today=None):
+    """Room type, price and availability counts for a Room query.
+
+    query has every filter applied except the three faceted ones, which
+    are passed in instead. One grouped query returns a handful of rows
+    (room type x available x within price) with a conditional count per
+    price bucket; each facet is then totalled leaving out its own filter,
+    so a count is what the page shows after picking that option.
+    """
+    ranges = price_ranges()
+    is_available = case((available_on(today or date.today()), 1), else_=0).label('is_available')
+    in_price = case((price_between(min_price, max_price, price_below), 1), else_=0).label('in_price')
+    rows = query.with_entities(
+        Room.room_type, is_available, in_price, func.count(),
+        *[func.sum(case((in_bucket(low, high), 1), else_=0)) for low, high in ranges]
+    ).group_by(Room.room_type, is_available, in_price).order_by(None).all()
+
+    total = available_count = 0
+    room_types = {}
+    prices = [0] * len(ranges)
+    for row_type, row_available, row_in_price, count, *bucket_counts in rows:
+        type_ok = not room_type or row_type == room_type
+        available_ok = row_available or not available
+        if row_in_price and available_ok:
+            room_types[row_type] = room_types.get(row_type, 0) + count
+        if type_ok and available_ok:
+            prices = [a + (b or 0) for a, b in zip(prices, bucket_counts)]
+        if type_ok and row_in_price:
+            available_count += count if row_available else 0
+            if available_ok:
+                total += count
+
+    return {
+        'total': total,
+        'room_type': room_types,
+        'price': [{'min': low, 'max': high, 'count': count} for (low, high), count in zip(ranges, prices)],
+        'available': available_count,
+    }
+
+
+def filter_signature(args):
+    return urlencode(sorted((name, args[name]) for name in FILTER_ARGS if args.get(name)))
+
+
+def cached_facet_counts(query, args, **filters):
+    """facet_counts, shared between requests with the same filters.
+
+    Entries go with the 'rooms' tag like the listing pages, which every
+    booking status change invalidates since it can change availability.
+    They are also keyed by day, as availability is counted for today.
+    """
+    key = f'facets:{date.today().isoformat()}:{filter_signature(args)}'
+    return response_cache.memoize(key, lambda: facet_counts(query, **filters), tags=('rooms',))
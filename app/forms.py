@@ -1,8 +1,9 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, SelectField, TextAreaField, FloatField, DateField, IntegerField, SubmitField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, NumberRange
-from app.models import User, Booking
+from wtforms import StringField, PasswordField, SelectField, SelectMultipleField, TextAreaField, FloatField, DateField, IntegerField, SubmitField
+from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, NumberRange, Optional
+from app.models import User
+from app.availability import find_conflict, conflict_message
 from datetime import date
 from flask_login import current_user
 
@@ -39,6 +40,8 @@ class ProfileForm(FlaskForm):
 class RoomForm(FlaskForm):
     title = StringField('Room Title', validators=[DataRequired(), Length(max=200)])
     location = StringField('Location', validators=[DataRequired(), Length(max=200)])
+    latitude = FloatField('Latitude (Optional)', validators=[Optional(), NumberRange(min=-90, max=90)])
+    longitude = FloatField('Longitude (Optional)', validators=[Optional(), NumberRange(min=-180, max=180)])
     rent_price = FloatField('Monthly Rent (Rs)', validators=[DataRequired(), NumberRange(min=0)])
     room_type = SelectField('Room Type', choices=[
         ('Single Room', 'Single Room'),
@@ -77,21 +80,10 @@ class BookingForm(FlaskForm):
             
 
         if room_id:
-            existing_booking = Booking.query.filter(
-                Booking.room_id == room_id,
-                Booking.status.in_(['pending', 'confirmed']), 
-                Booking.start_date <= self.end_date.data,
-                Booking.end_date >= self.start_date.data
-            ).first()
+            existing_booking = find_conflict(room_id, self.start_date.data, self.end_date.data)
             
             if existing_booking:
-                
-                start_str = existing_booking.start_date.strftime('%Y-%m-%d')
-                end_str = existing_booking.end_date.strftime('%Y-%m-%d')
-                
-                self.start_date.errors.append(
-                    f'Room already booked from {start_str} to {end_str}. Please choose different dates.'
-                )
+                self.start_date.errors.append(conflict_message(existing_booking))
                 return False
             
         return True
@@ -111,3 +103,10 @@ class ResetPasswordForm(FlaskForm):
         EqualTo('new_password', message='Passwords must match')
     ])
     submit = SubmitField('Reset Password')
+
+class ModerationForm(FlaskForm):
+    # Any ids may be posted; rooms that are gone or no longer pending are reported back
+    room_ids = SelectMultipleField('Rooms', coerce=int, validate_choice=False,
+                                   validators=[DataRequired(message='Select at least one room.')])
+    action = SelectField('Action', choices=[('approve', 'Approve'), ('reject', 'Reject')],
+                         validators=[DataRequired()])
@@ -0,0 +1,213 @@
+import csv
+import math
+import os
+import re
+from sqlalchemy import DDL, event, select, text, literal_column
+from app import db
+from app.models import Room
+
+KM_PER_DEGREE = 111.195
+DEFAULT_RADIUS_KM = 3.0
+MAX_RADIUS_KM = 50.0
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.csv')
+
+# One point per room with coordinates; an R*Tree answers "which ids fall
+# in this box" without looking at rooms outside it.
+create_rooms_rtree = DDL(
+    'CREATE VIRTUAL TABLE IF NOT EXISTS rooms_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)'
+)
+event.listen(Room.__table__, 'after_create', create_rooms_rtree.execute_if(dialect='sqlite'))
+
+_gazetteers = {}
+
+
+def is_rtree_enabled(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def load_gazetteer(path=None):
+    """Place names and coordinates from a name,latitude,longitude CSV"""
+    path = path or GAZETTEER_PATH
+    if path not in _gazetteers:
+        with open(path, newline='', encoding='utf-8') as f:
+            _gazetteers[path] = [
+                (re.compile(r'\b' + re.escape(row['name'].strip().lower()) + r'\b'),
+                 float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(f) if row.get('name')
+            ]
+    return _gazetteers[path]
+
+
+def lookup_place(name, gazetteer=None):
+    """(latitude, longitude) of the most specific known place named in text, or None.
+
+    Addresses go from the street outwards ('Thamel, Kathmandu'), so the
+    place mentioned first wins, and the longer name where two start
+    together ('New Baneshwor' over 'Baneshwor').
+    """
+    if not name:
+        return None
+    name = name.lower()
+    best = None
+    for pattern, latitude, longitude in gazetteer or load_gazetteer():
+        match = pattern.search(name)
+        if match is not None:
+            rank = (match.start(), -len(match.group()))
+            if best is None or rank < best[0]:
+                best = (rank, latitude, longitude)
+    return best[1:] if best is not None else None
+
+
+def resolve_coordinates(location, latitude, longitude):
+    """Coordinates given on the form, else looked up from the location text"""
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    return lookup_place(location) or (None, None)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - lat_delta, longitude - lng_delta, latitude + lat_delta, longitude + lng_delta
+
+
+def within_box(query, min_lat, min_lng, max_lat, max_lng):
+    if not is_rtree_enabled(db.session.connection()):
+        return query.filter(Room.latitude.between(min_lat, max_lat), Room.longitude.between(min_lng, max_lng))
+
+    boxed = select(literal_column('id').label('room_id')).select_from(text('rooms_rtree')).where(
+        text('max_lat >= :min_lat AND min_lat <= :max_lat AND max_lng >= :min_lng AND min_lng <= :max_lng')
+        .bindparams(min_lat=min_lat, max_lat=max_lat, min_lng=min_lng, max_lng=max_lng)
+    ).subquery()
+    return query.join(boxed, boxed.c.room_id == Room.id)
+
+
+def nearest_first(query, latitude, longitude, radius_km=None):
+    """Restrict to rooms within radius_km (if given) and return the query
+    and a score column that sorts nearest first when descending.
+
+    Distances use an equirectangular projection around the origin, which
+    is plain arithmetic in SQL and well within a metre at city scale.
+    """
+    scale = math.cos(math.radians(latitude))
+    north = Room.latitude - latitude
+    east = (Room.longitude - longitude) * scale
+    squared = north * north + east * east
+
+    query = query.filter(Room.latitude.isnot(None), Room.longitude.isnot(None))
+    if radius_km is not None:
+        query = within_box(query, *bounding_box(latitude, longitude, radius_km))
+        query = query.filter(squared <= (radius_km / KM_PER_DEGREE) ** 2)
+    return query, (-squared).label('proximity')
+
+
+def parse_geo_args(args):
+    """Read near/lat/lng/radius_km/bbox from request args.
+
+    Returns (origin, radius_km, box, error). origin is (lat, lng) or None;
+    box is (min_lat, min_lng, max_lat, max_lng) or None.
+    """
+    box = None
+    if args.get('bbox'):
+        try:
+            box = tuple(float(part) for part in args['bbox'].split(','))
+        except ValueError:
+            box = ()
+        if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+            return None, None, None, 'bbox must be min_lat,min_lng,max_lat,max_lng'
+
+    origin = None
+    if args.get('near'):
+        origin = lookup_place(args['near'])
+        if origin is None:
+            return None, None, None, f'Unknown place "{args["near"]}"'
+    elif args.get('lat') and args.get('lng'):
+        try:
+            origin = (float(args['lat']), float(args['lng']))
+        except ValueError:
+            return None, None, None, 'lat and lng must be numbers'
+        if not (-90 <= origin[0] <= 90 and -180 <= origin[1] <= 180):
+            return None, None, None, 'lat or lng out of range'
+
+    radius_km = None
+    if origin is not None and box is None:
+        try:
+            radius_km = float(args.get('radius_km') or DEFAULT_RADIUS_KM)
+        except ValueError:
+            return None, None, None, 'radius_km must be a number'
+        radius_km = min(max(radius_km, 0.1), MAX_RADIUS_KM)
+    elif box is not None and origin is None:
+        origin = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+
+    return origin, radius_km, box, None
+
+
+def filter_by_geo(query, args):
+    """Apply a radius or bounding box filter from request args to a Room query.
+
+    Returns (query, score column or None, origin or None, error or None).
+    """
+    origin, radius_km, box, error = parse_geo_args(args)
+    if error or origin is None:
+        return query, None, None, error
+    if box is not None:
+        query = within_box(query, *box)
+    query, score = nearest_first(query, origin[0], origin[1], radius_km)
+    return query, score, origin, None
+
+
+def index_room_location(connection, room):
+    connection.execute(text('DELETE FROM rooms_rtree WHERE id = :id'), {'id': room.id})
+    if room.latitude is not None and room.longitude is not None:
+        connection.execute(
+            text('INSERT INTO rooms_rtree (id, min_lat, max_lat, min_lng, max_lng) '
+                 'VALUES (:id, :lat, :lat, :lng, :lng)'),
+            {'id': room.id, 'lat': room.latitude, 'lng': room.longitude}
+        )
+
+
+def index_new_room_locations(connection, rooms):
+    """Index rooms added with a bulk INSERT, which skips mapper events.
+
+    rooms are mappings with id, latitude and longitude.
+    """
+    if not is_rtree_enabled(connection):
+        return
+    rows = [
+        {'id': room['id'], 'lat': room['latitude'], 'lng': room['longitude']}
+        for room in rooms if room.get('latitude') is not None and room.get('longitude') is not None
+    ]
+    if rows:
+        connection.execute(
+            text('INSERT INTO rooms_rtree (id, min_lat, max_lat, min_lng, max_lng) '
+                 'VALUES (:id, :lat, :lat, :lng, :lng)'),
+            rows
+        )
+
+
+@event.listens_for(Room, 'after_insert')
+def room_inserted(mapper, connection, room):
+    if is_rtree_enabled(connection):
+        index_room_location(connection, room)
+
+
+@event.listens_for(Room, 'after_update')
+def room_updated(mapper, connection, room):
+    if not is_rtree_enabled(connection):
+        return
+    state = db.inspect(room)
+    if any(state.attrs[name].history.has_changes() for name in ('latitude', 'longitude')):
+        index_room_location(connection, room)
+
+
+@event.listens_for(Room, 'after_delete')
+def room_deleted(mapper, connection, room):
+    if is_rtree_enabled(connection):
+        connection.execute(text('DELETE FROM rooms_rtree WHERE id = :id'), {'id': room.id})
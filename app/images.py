@@ -0,0 +1,140 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from PIL import Image, ImageOps
+from app import db, response_cache, user_cache
+from app.models import Room, User
+
+# Widths generated for each kind of upload. Every width is written as
+# WebP for srcset; the fallback width is also written as a JPEG for
+# browsers without WebP support.
+ROOM_WIDTHS = (400, 800, 1600)
+ROOM_FALLBACK_WIDTH = 800
+AVATAR_WIDTHS = (96, 192)
+AVATAR_FALLBACK_WIDTH = 192
+
+PROCESSED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+_executor = None
+
+
+def get_executor(max_workers):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max_workers)
+    return _executor
+
+
+def _resized(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def render_variants(source_path, widths, fallback_width):
+    """Write resized copies of source_path next to it and describe them.
+
+    Runs in a worker process. Orientation from EXIF is applied to the
+    pixels and no metadata is copied into the variants.
+    """
+    directory, basename = os.path.split(source_path)
+    stem = os.path.splitext(basename)[0]
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+        else:
+            image = image.convert('RGB')
+
+        webp = []
+        for width in widths:
+            resized = _resized(image, width)
+            name = f'{stem}_{width}.webp'
+            resized.save(os.path.join(directory, name), 'WEBP', quality=80, method=6)
+            webp.append([resized.width, name])
+            if resized is image:
+                break
+
+        fallback = _resized(image, fallback_width)
+        if fallback.mode == 'RGBA':
+            background = Image.new('RGB', fallback.size, (255, 255, 255))
+            background.paste(fallback, mask=fallback.getchannel('A'))
+            fallback = background
+        jpeg = f'{stem}_{fallback_width}.jpg'
+        fallback.save(os.path.join(directory, jpeg), 'JPEG', quality=82, optimize=True, progressive=True)
+
+    return {'webp': webp, 'jpeg': jpeg}
+
+
+def _store_variants(app, model, pk, filename_attr, variants_attr, filename, variants):
+    with app.app_context():
+        updated = model.query.filter(
+            model.id == pk,
+            getattr(model, filename_attr) == filename
+        ).update({variants_attr: variants}, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            return
+        # Bulk updates skip mapper events, so drop the cached user here
+        if model is User:
+            user_cache.invalidate(pk)
+        # Cached pages still point at the original upload
+        if model is Room:
+            response_cache.invalidate('rooms', f'room:{pk}')
+
+
+def _queue(model, pk, filename_attr, variants_attr, filename, widths, fallback_width):
+    if filename.rsplit('.', 1)[-1].lower() not in PROCESSED_EXTENSIONS:
+        return
+
+    app = current_app._get_current_object()
+
+    # Uploads are deduplicated by content, so another row may already
+    # have variants for this exact file.
+    existing = model.query.filter(
+        getattr(model, filename_attr) == filename,
+        getattr(model, variants_attr).isnot(None)
+    ).first()
+    if existing is not None:
+        _store_variants(app, model, pk, filename_attr, variants_attr, filename, getattr(existing, variants_attr))
+        return
+
+    source_path = os.path.join(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+    workers = app.config['IMAGE_WORKERS']
+
+    if not workers:
+        try:
+            variants = render_variants(source_path, widths, fallback_width)
+        except Exception:
+            app.logger.exception('Could not generate image variants for %s', filename)
+            return
+        _store_variants(app, model, pk, filename_attr, variants_attr, filename, variants)
+        return
+
+    def done(future):
+        try:
+            variants = future.result()
+        except Exception:
+            app.logger.exception('Could not generate image variants for %s', filename)
+            return
+        _store_variants(app, model, pk, filename_attr, variants_attr, filename, variants)
+
+    get_executor(workers).submit(render_variants, source_path, widths, fallback_width).add_done_callback(done)
+
+
+def queue_room_image(room):
+    """Generate card and detail sizes for the room's image in the background.
+
+    Until they exist (or if generation fails) templates keep serving the
+    original upload. The result is discarded if the room's image was
+    replaced again in the meantime.
+    """
+    _queue(Room, room.id, 'image_filename', 'image_variants', room.image_filename,
+           ROOM_WIDTHS, ROOM_FALLBACK_WIDTH)
+
+
+def queue_profile_image(user):
+    _queue(User, user.id, 'profile_image', 'profile_image_variants', user.profile_image,
+           AVATAR_WIDTHS, AVATAR_FALLBACK_WIDTH)
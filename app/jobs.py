@@ -0,0 +1,220 @@
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import Job
+
+# Task name -> function called with the job's payload as keyword arguments
+TASKS = {}
+
+INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name=None):
+    """Register a function as a job that can be enqueued by name"""
+    def decorator(func):
+        TASKS[name or func.__name__] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=None):
+    """Add a job to the current transaction.
+
+    The job only exists once the caller commits, so it is never run for
+    a change that was rolled back. A second job with the same key is
+    silently dropped, which makes retried requests safe.
+    """
+    values = {
+        'name': name,
+        'payload': payload or {},
+        'key': key,
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+        'run_at': datetime.utcnow() + timedelta(seconds=delay),
+        'created_at': datetime.utcnow(),
+    }
+    dialect_insert = INSERTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        db.session.execute(dialect_insert(Job.__table__).values(**values).on_conflict_do_nothing(index_elements=['key']))
+    elif key is None or db.session.scalar(select(Job.id).where(Job.key == key)) is None:
+        db.session.execute(insert(Job.__table__).values(**values))
+
+
+def retry_delay(attempts):
+    """Seconds before the next try: doubling from JOB_RETRY_DELAY, with jitter"""
+    config = current_app.config
+    delay = min(config['JOB_RETRY_MAX_DELAY'], config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1))
+    return delay * random.uniform(0.75, 1.25)
+
+
+def claim(worker_id):
+    """Mark the next due job as running for worker_id and return it, or None.
+
+    Jobs left running longer than JOB_LOCK_TIMEOUT are taken over, on the
+    assumption that their worker died.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT'])
+    claimable = or_(
+        and_(jobs.c.status == 'queued', jobs.c.run_at <= now),
+        and_(jobs.c.status == 'running', jobs.c.locked_at < stale),
+    )
+    next_id = (
+        select(jobs.c.id).where(claimable).order_by(jobs.c.run_at, jobs.c.id).limit(1)
+        .with_for_update(skip_locked=True).scalar_subquery()
+    )
+    # One statement, so two workers can never claim the same job
+    job = db.session.execute(
+        update(jobs).where(jobs.c.id == next_id, claimable)
+        .values(status='running', locked_by=worker_id, locked_at=now, attempts=jobs.c.attempts + 1)
+        .returning(jobs.c.id, jobs.c.name, jobs.c.payload, jobs.c.attempts, jobs.c.max_attempts)
+    ).mappings().first()
+    db.session.commit()
+    return job
+
+
+def _finish(job, worker_id, **values):
+    jobs = Job.__table__
+    db.session.execute(
+        update(jobs).where(jobs.c.id == job['id'], jobs.c.locked_by == worker_id)
+        .values(locked_by=None, locked_at=None, **values)
+    )
+    db.session.commit()
+
+
+def run(job, worker_id):
+    """Run a claimed job and record the outcome: 'done', 'retry' or 'failed'"""
+    try:
+        func = TASKS.get(job['name'])
+        if func is None:
+            raise UnknownTask(job['name'])
+        func(**job['payload'])
+    except Exception as exc:
+        db.session.rollback()
+        error = traceback.format_exc()
+        if isinstance(exc, UnknownTask) or job['attempts'] >= job['max_attempts']:
+            current_app.logger.error('Job %s (%s) failed for good: %s', job['id'], job['name'], exc)
+            _finish(job, worker_id, status='failed', last_error=error, finished_at=datetime.utcnow())
+            return 'failed'
+        delay = retry_delay(job['attempts'])
+        current_app.logger.warning('Job %s (%s) failed, retrying in %.0fs: %s', job['id'], job['name'], delay, exc)
+        _finish(job, worker_id, status='queued', last_error=error,
+                run_at=datetime.utcnow() + timedelta(seconds=delay))
+        return 'retry'
+
+    _finish(job, worker_id, status='done', last_error=None, finished_at=datetime.utcnow())
+    return 'done'
+
+
+def work(app, burst=False, poll_interval=None, worker_id=None):
+    """Run jobs until SIGTERM or SIGINT, or with burst until none are due.
+
+    A job in progress is always finished before stopping. Returns the
+    number of jobs run.
+    """
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    poll_interval = poll_interval if poll_interval is not None else app.config['JOB_POLL_INTERVAL']
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+    processed = 0
+    try:
+        while not stopping:
+            with app.app_context():
+                job = claim(worker_id)
+                if job is not None:
+                    run(job, worker_id)
+                    processed += 1
+                    continue
+            if burst:
+                break
+            time.sleep(poll_interval)
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return processed
+
+
+def _work_in_child(app, burst, poll_interval):
+    with app.app_context():
+        # Connections inherited from the parent must not be shared
+        db.engine.dispose(close=False)
+    work(app, burst=burst, poll_interval=poll_interval)
+
+
+def run_workers(app, processes=1, burst=False, poll_interval=None):
+    """work() in this process, or in several forked ones.
+
+    SIGTERM or SIGINT to the parent is passed on to every child, which
+    stops after its current job.
+    """
+    if processes <= 1:
+        return work(app, burst=burst, poll_interval=poll_interval)
+
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_work_in_child, args=(app, burst, poll_interval))
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+
+    def stop(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+
+    previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        for child in children:
+            child.join()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def queue_status():
+    """Job counts by status, and how late the oldest due job is in seconds"""
+    counts = dict(db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+    oldest = db.session.scalar(
+        select(func.min(Job.run_at)).where(Job.status == 'queued', Job.run_at <= datetime.utcnow())
+    )
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest is not None else 0.0
+    return counts, lag
+
+
+def requeue_failed(job_ids=None):
+    """Give failed jobs a fresh set of attempts; returns how many"""
+    query = update(Job.__table__).where(Job.status == 'failed')
+    if job_ids:
+        query = query.where(Job.id.in_(job_ids))
+    count = db.session.execute(
+        query.values(status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def purge(older_than):
+    """Delete jobs that finished before older_than; returns how many"""
+    count = db.session.execute(
+        delete(Job.__table__).where(Job.status.in_(('done', 'failed')), Job.finished_at < older_than)
+    ).rowcount
+    db.session.commit()
+    return count
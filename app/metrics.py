@@ -0,0 +1,308 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from flask import Response, g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows; only a single-process server is safe there
+    fcntl = None
+
+# Counters and histograms of workers that have exited, summed
+EXITED_FILE = 'exited.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency, by endpoint.'),
+    'http_requests_in_flight': ('gauge', 'Requests currently being handled.'),
+    'db_pool_checked_out': ('gauge', 'Database connections currently checked out of the pool.'),
+    'db_pool_overflow': ('gauge', 'Connections open beyond the pool size.'),
+    'db_pool_size': ('gauge', 'Configured database pool size.'),
+    'upload_bytes_total': ('counter', 'Bytes received in image uploads.'),
+    'uploads_total': ('counter', 'Image uploads received.'),
+    'cache_requests_total': ('counter', 'Cache lookups, by cache and result.'),
+    'cache_hit_ratio': ('gauge', 'Share of cache lookups that were hits.'),
+    'bookings_total': ('counter', 'Booking lifecycle events, by event.'),
+    'rooms_moderated_total': ('counter', 'Pending rooms approved or rejected, by new status.'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshots):
+    """Sum snapshots into (counters, histograms, gauges) keyed by (name, labels)"""
+    counters, histograms, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(values))
+            histograms[key] = [a + b for a, b in zip(merged, values)]
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+class Metrics:
+    """Prometheus metrics kept in process memory.
+
+    With METRICS_DIR set, every worker process periodically writes its
+    values to its own file there and /metrics sums all of them. Files of
+    workers that have exited are folded into EXITED_FILE and deleted, so
+    totals never go backwards and the directory does not grow; their
+    gauges are dropped. Each file is named after its process's pid and a
+    random token, so a new worker that reuses a pid never overwrites
+    another's counters.
+    """
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.in_flight = 0
+        self.directory = None
+        self.flush_interval = 0
+        self.last_flush = 0.0
+        self.token_pid = None
+        self.token = None
+        self.engine = None
+        self.caches = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        if not app.config['METRICS']:
+            return
+
+        self.directory = app.config['METRICS_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+        from app import db, response_cache, user_cache
+        self.caches = {'response': response_cache, 'user': user_cache}
+        with app.app_context():
+            self.engine = db.engine
+
+        @app.before_request
+        def start_request():
+            g.metrics_started = time.perf_counter()
+            g.metrics_in_flight = True
+            with self.lock:
+                self.in_flight += 1
+
+        @app.after_request
+        def record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                endpoint = request.endpoint or 'unmatched'
+                self.inc('http_requests_total', endpoint=endpoint, method=request.method,
+                         status=response.status_code)
+                self.observe('http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+            return response
+
+        @app.teardown_request
+        def finish_request(exc):
+            if g.pop('metrics_in_flight', False):
+                with self.lock:
+                    self.in_flight -= 1
+            if self.directory and time.time() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+        @app.route('/metrics')
+        def prometheus_metrics():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted((label, str(v)) for label, v in labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def gauges(self):
+        """Point-in-time values of this process"""
+        values = {('http_requests_in_flight', ()): self.in_flight}
+        pool = self.engine.pool if self.engine is not None else None
+        for name, method in (('db_pool_checked_out', 'checkedout'), ('db_pool_overflow', 'overflow'),
+                             ('db_pool_size', 'size')):
+            if hasattr(pool, method):
+                values[(name, ())] = getattr(pool, method)()
+        if ('db_pool_overflow', ()) in values:
+            # QueuePool counts overflow from -size while under capacity
+            values[('db_pool_overflow', ())] = max(0, values[('db_pool_overflow', ())])
+        return values
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            for cache_name, cache in self.caches.items():
+                counters[('cache_requests_total', (('cache', cache_name), ('result', 'hit')))] = cache.hits
+                counters[('cache_requests_total', (('cache', cache_name), ('result', 'miss')))] = cache.misses
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self.gauges().items()],
+            }
+
+    def file_name(self):
+        """This process's file; the token is made again after a fork"""
+        if self.token_pid != os.getpid():
+            self.token_pid = os.getpid()
+            self.token = uuid.uuid4().hex[:12]
+        return f'metrics-{self.token_pid}-{self.token}.json'
+
+    def flush(self):
+        """Write this process's values to METRICS_DIR"""
+        if not self.directory:
+            return
+        self.last_flush = time.time()
+        self._write(self.file_name(), self.snapshot())
+
+    def _write(self, name, snapshot):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, os.path.join(self.directory, name))
+
+    @contextmanager
+    def directory_lock(self):
+        """Held while reading or folding the worker files, so one process
+        never reads a file another is folding away"""
+        if fcntl is None:
+            with self.lock:
+                yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def worker_files(self):
+        """(path, exited) for every other worker's file"""
+        own = self.file_name()
+        files = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            name = os.path.basename(path)
+            if name == own:
+                continue
+            # metrics-<pid>-<token>.json, or metrics-<pid>.json from before tokens
+            pid = int(name[len('metrics-'):-len('.json')].split('-')[0])
+            # A file with this process's pid but not its name is a dead worker's
+            files.append((path, pid == os.getpid() or not _pid_alive(pid)))
+        return files
+
+    def fold_exited(self, files):
+        """Add the counters and histograms of exited workers to EXITED_FILE
+        and delete their files; returns the files still live"""
+        exited = [path for path, is_exited in files if is_exited]
+        if not exited:
+            return [path for path, _ in files]
+        snapshots = [_load(os.path.join(self.directory, EXITED_FILE)) or {'counters': [], 'histograms': []}]
+        snapshots += [snapshot for snapshot in map(_load, exited) if snapshot is not None]
+        counters, histograms, _ = _merge({**snapshot, 'gauges': []} for snapshot in snapshots)
+        self._write(EXITED_FILE, {
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+            'gauges': [],
+        })
+        for path in exited:
+            os.remove(path)
+        return [path for path, is_exited in files if not is_exited]
+
+    def collect(self):
+        """This process's live values merged with every other worker's file"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            with self.directory_lock():
+                live = self.fold_exited(self.worker_files())
+                for path in live + [os.path.join(self.directory, EXITED_FILE)]:
+                    snapshot = _load(path)
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+
+        counters, histograms, gauges = _merge(snapshots)
+
+        for cache_name in self.caches:
+            hits = counters.get(('cache_requests_total', (('cache', cache_name), ('result', 'hit'))), 0)
+            misses = counters.get(('cache_requests_total', (('cache', cache_name), ('result', 'miss'))), 0)
+            gauges[('cache_hit_ratio', (('cache', cache_name),))] = hits / (hits + misses) if hits + misses else 0.0
+        return counters, histograms, gauges
+
+    def render(self):
+        counters, histograms, gauges = self.collect()
+        series = {}
+        for (name, labels), value in list(counters.items()) + list(gauges.items()):
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        # Histogram lines stay in bucket order, one label set at a time
+        for (name, labels), values in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), values[:-2] + [values[-1]]):
+                le = (('le', _format_value(bound) if bound != float('inf') else '+Inf'),)
+                lines.append(f'{name}_bucket{_format_labels(labels + le)} {_format_value(count)}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {values[-2]!r}')
+            lines.append(f'{name}_count{_format_labels(labels)} {_format_value(values[-1])}')
+
+        output = []
+        for name in sorted(series):
+            kind, description = HELP.get(name, ('untyped', ''))
+            output.append(f'# HELP {name} {description}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(series[name] if HELP.get(name, ('',))[0] == 'histogram' else sorted(series[name]))
+        return '\n'.join(output) + '\n'
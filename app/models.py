@@ -1,23 +1,32 @@
-from app import db, login_manager
+from app import db, login_manager, user_cache
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from app.passwords import hash_password, verify_password, needs_rehash
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(db.session, User, int(user_id))
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # For reference counting stored uploads before deleting one
+        db.Index('ix_users_profile_image', 'profile_image'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20), nullable= False)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), default='viewer')  
+    # Previous values are loaded on change so the stats counters see every transition
+    role = db.column_property(db.Column(db.String(20), default='viewer'), active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     profile_image = db.Column(db.String(255), default='default-user.jpg')
+    profile_image_variants = db.Column(db.JSON(none_as_null=True))
+    pending_bookings_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 
  
@@ -26,60 +35,98 @@ class User(UserMixin, db.Model):
     reviews = db.relationship('Review', backref='reviewer', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.email}>'
 
 class Room(db.Model):
     __tablename__ = 'rooms'
+    __table_args__ = (
+        db.Index('ix_rooms_status_created_at', 'status', 'created_at'),
+        db.Index('ix_rooms_owner_id', 'owner_id'),
+        db.Index('ix_rooms_image_filename', 'image_filename'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     location = db.Column(db.String(200), nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     rent_price = db.Column(db.Float, nullable=False)
     room_type = db.Column(db.String(50), nullable=False)  
     description = db.Column(db.Text)
     image_filename = db.Column(db.String(255), default='default_room.jpg')
+    image_variants = db.Column(db.JSON(none_as_null=True))
     available_from = db.Column(db.Date, nullable=False)
     available_to = db.Column(db.Date)
-    status = db.Column(db.String(20), default='pending')  
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     
     bookings = db.relationship('Booking', backref='room', lazy=True, cascade='all, delete-orphan')
     reviews = db.relationship('Review', backref='room', lazy=True, cascade='all, delete-orphan')
 
     def average_rating(self):
-        if not self.reviews:
+        if not self.rating_count:
             return 0
-        return sum(review.rating for review in self.reviews) / len(self.reviews)
+        return self.rating_sum / self.rating_count
 
     def __repr__(self):
         return f'<Room {self.title}>'
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_room_status_dates', 'room_id', 'status', 'start_date', 'end_date'),
+        db.Index('ix_bookings_renter_id', 'renter_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
     renter_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
-    status = db.Column(db.String(20), default='pending') 
+    # Load the previous value on change so the pending counter sees every transition
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
     total_price = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+
+    booked_dates = db.relationship('BookedDate', backref='booking', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Booking {self.id} for Room {self.room_id}>'
 
+class BookedDate(db.Model):
+    """One row per day a pending or confirmed booking holds a room.
+
+    The (room_id, day) primary key is what makes double booking
+    impossible: two transactions reserving the same day cannot both commit.
+    """
+    __tablename__ = 'booked_dates'
+
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<BookedDate {self.day} for Room {self.room_id}>'
+
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_room_created_at', 'room_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
@@ -91,3 +138,160 @@ class Review(db.Model):
     def __repr__(self):
         return f'<Review {self.id} for Room {self.room_id}>'
 
+class StatCounter(db.Model):
+    """Running row counts such as 'rooms.pending', kept up to date by app.stats"""
+    __tablename__ = 'stat_counters'
+
+    name = db.Column(db.String(60), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class RoomMonthlyStat(db.Model):
+    """Confirmed nights and revenue of one room in one calendar month.
+
+    Kept up to date by app.revenue as bookings are confirmed, rejected
+    or deleted; owner analytics read only these rows.
+    """
+    __tablename__ = 'room_monthly_stats'
+    __table_args__ = (
+        db.Index('ix_room_monthly_stats_owner_month', 'owner_id', 'month'),
+    )
+
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), primary_key=True)
+    # First day of the month
+    month = db.Column(db.Date, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    nights = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    # Confirmed bookings whose stay starts in the month
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<RoomMonthlyStat room {self.room_id} {self.month:%Y-%m}>'
+
+class Job(db.Model):
+    """A unit of background work, run by flask jobs worker.
+
+    queued -> running -> done, or back to queued with a later run_at
+    after a failure, until max_attempts is used up and it is left failed.
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # Enqueueing again with the same key is a no-op
+    key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
+
+class DailyStat(db.Model):
+    """Rows created per day, such as 'new_bookings', for the admin charts"""
+    __tablename__ = 'daily_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    name = db.Column(db.String(60), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyStat {self.day} {self.name}={self.value}>'
+
+
+def _adjust_room_rating(connection, room_id, rating_delta, count_delta):
+    rooms = Room.__table__
+    connection.execute(
+        rooms.update()
+        .where(rooms.c.id == room_id)
+        .values(
+            rating_sum=rooms.c.rating_sum + rating_delta,
+            rating_count=rooms.c.rating_count + count_delta,
+            updated_at=datetime.utcnow()
+        )
+    )
+
+
+@event.listens_for(Review, 'after_insert')
+def review_inserted(mapper, connection, review):
+    _adjust_room_rating(connection, review.room_id, review.rating, 1)
+
+
+@event.listens_for(Review, 'after_update')
+def review_updated(mapper, connection, review):
+    history = db.inspect(review).attrs.rating.history
+    if history.deleted and history.added:
+        _adjust_room_rating(connection, review.room_id, history.added[0] - history.deleted[0], 0)
+
+
+@event.listens_for(Review, 'after_delete')
+def review_deleted(mapper, connection, review):
+    _adjust_room_rating(connection, review.room_id, -review.rating, -1)
+
+
+def _adjust_owner_pending(connection, room_id, delta):
+    users = User.__table__
+    rooms = Room.__table__
+    owner_id = select(rooms.c.owner_id).where(rooms.c.id == room_id).scalar_subquery()
+    connection.execute(
+        users.update()
+        .where(users.c.id == owner_id)
+        .values(pending_bookings_count=users.c.pending_bookings_count + delta)
+    )
+
+
+@event.listens_for(Booking, 'after_insert')
+def booking_inserted(mapper, connection, booking):
+    if booking.status == 'pending':
+        _adjust_owner_pending(connection, booking.room_id, 1)
+
+
+@event.listens_for(Booking, 'after_update')
+def booking_updated(mapper, connection, booking):
+    history = db.inspect(booking).attrs.status.history
+    if not history.has_changes():
+        return
+    was_pending = 'pending' in history.deleted
+    if was_pending and booking.status != 'pending':
+        _adjust_owner_pending(connection, booking.room_id, -1)
+    elif not was_pending and booking.status == 'pending':
+        _adjust_owner_pending(connection, booking.room_id, 1)
+
+
+@event.listens_for(Booking, 'after_delete')
+def booking_deleted(mapper, connection, booking):
+    if booking.status == 'pending':
+        _adjust_owner_pending(connection, booking.room_id, -1)
+
+
+# Cached users are dropped once the change that touched them is committed,
+# so another request cannot re-cache the old row in between.
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def user_changed(mapper, connection, user):
+    object_session(user).info.setdefault('changed_users', set()).add(user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_users(session):
+    changed = session.info.pop('changed_users', None)
+    if changed:
+        user_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop('changed_users', None)
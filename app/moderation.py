@@ -0,0 +1,71 @@
+from datetime import datetime
+from flask import current_app
+from flask.signals import Namespace
+from sqlalchemy import select, update
+from app import db, response_cache, metrics
+from app.models import Room
+from app.search import index_new_rooms
+from app.stats import add_to_counter
+from app.notifications import rooms_decided
+
+ACTIONS = {'approve': 'approved', 'reject': 'rejected'}
+# Ids per UPDATE, well under SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+signals = Namespace()
+# Sent by the app once per batch after it is committed, with status and room_ids
+rooms_moderated = signals.signal('rooms-moderated')
+
+
+def moderate_rooms(room_ids, status):
+    """Move the pending rooms among room_ids to status and commit.
+
+    One UPDATE ... WHERE id IN (...) AND status = 'pending' does the
+    work, so a room another moderator already handled is left alone.
+    That UPDATE skips the mapper events, so the search index and stats
+    counters are brought up to date here, and the owners' notification
+    emails are queued before the commit. Returns {room_id: outcome},
+    where outcome is the new status, 'already <status>' or 'not found'.
+    """
+    room_ids = list(dict.fromkeys(room_ids))
+    if not room_ids:
+        return {}
+
+    rooms = Room.__table__
+    now = datetime.utcnow()
+    changed = []
+    for start in range(0, len(room_ids), CHUNK_SIZE):
+        changed.extend(db.session.execute(
+            update(rooms)
+            .where(rooms.c.id.in_(room_ids[start:start + CHUNK_SIZE]), rooms.c.status == 'pending')
+            .values(status=status, updated_at=now)
+            .returning(rooms.c.id, rooms.c.owner_id, rooms.c.title, rooms.c.location, rooms.c.description,
+                       rooms.c.status)
+        ).mappings().all())
+
+    connection = db.session.connection()
+    if status == 'approved':
+        # Pending rooms are not in the search index yet
+        index_new_rooms(connection, changed)
+    add_to_counter(connection, 'rooms.pending', -len(changed))
+    add_to_counter(connection, f'rooms.{status}', len(changed))
+
+    outcomes = {row['id']: status for row in changed}
+    missed = [room_id for room_id in room_ids if room_id not in outcomes]
+    current = {}
+    for start in range(0, len(missed), CHUNK_SIZE):
+        current.update(db.session.execute(
+            select(rooms.c.id, rooms.c.status).where(rooms.c.id.in_(missed[start:start + CHUNK_SIZE]))
+        ).all())
+    for room_id in missed:
+        outcomes[room_id] = f'already {current[room_id]}' if room_id in current else 'not found'
+    # Queued in the same transaction, so the emails go out exactly when the change sticks
+    rooms_decided(changed, status)
+    db.session.commit()
+
+    changed_ids = [row['id'] for row in changed]
+    if changed_ids:
+        response_cache.invalidate('rooms', *[f'room:{room_id}' for room_id in changed_ids])
+        metrics.inc('rooms_moderated_total', len(changed_ids), status=status)
+        rooms_moderated.send(current_app._get_current_object(), status=status, room_ids=changed_ids)
+    return {room_id: outcomes[room_id] for room_id in room_ids}
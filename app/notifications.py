@@ -0,0 +1,66 @@
+from flask import current_app, render_template
+from flask_mail import Message
+from sqlalchemy import select
+from app import db, mail
+from app.jobs import task, enqueue
+from app.models import User, Room, Booking
+
+# Emails are sent by flask jobs worker; request handlers only enqueue them
+# in the same transaction as the change they describe.
+
+
+def send_email(recipient, subject, template, **context):
+    # Outside a request, so links are built from SITE_URL
+    with current_app.test_request_context(base_url=current_app.config['SITE_URL']):
+        body = render_template(template, **context)
+    mail.send(Message(subject, recipients=[recipient], body=body))
+
+
+def booking_requested(booking):
+    db.session.flush()  # for a new booking's id
+    enqueue('booking_requested', {'booking_id': booking.id}, key=f'booking-requested:{booking.id}')
+
+
+def booking_decided(booking):
+    enqueue('booking_decided', {'booking_id': booking.id}, key=f'booking-{booking.status}:{booking.id}')
+
+
+def rooms_decided(rooms, status):
+    """One job per owner for a moderation batch, so a failed send only retries that owner.
+
+    rooms are rows with id and owner_id.
+    """
+    by_owner = {}
+    for room in rooms:
+        by_owner.setdefault(room['owner_id'], []).append(room['id'])
+    for owner_id, room_ids in by_owner.items():
+        enqueue('rooms_moderated', {'owner_id': owner_id, 'room_ids': room_ids, 'status': status})
+
+
+@task('booking_requested')
+def send_booking_requested(booking_id):
+    booking = db.session.get(Booking, booking_id)
+    if booking is None or booking.status != 'pending':
+        return
+    send_email(booking.room.owner.email, f'Booking request for {booking.room.title}',
+               'email/booking_requested.txt', booking=booking)
+
+
+@task('booking_decided')
+def send_booking_decided(booking_id):
+    booking = db.session.get(Booking, booking_id)
+    if booking is None or booking.status not in ('confirmed', 'rejected'):
+        return
+    verb = 'approved' if booking.status == 'confirmed' else 'declined'
+    send_email(booking.renter.email, f'Your booking for {booking.room.title} was {verb}',
+               'email/booking_decided.txt', booking=booking, verb=verb)
+
+
+@task('rooms_moderated')
+def send_rooms_moderated(owner_id, room_ids, status):
+    owner = db.session.get(User, owner_id)
+    rooms = db.session.scalars(select(Room).where(Room.id.in_(room_ids)).order_by(Room.id)).all()
+    if owner is None or not rooms:
+        return
+    subject = f'{len(rooms)} of your listings {"were" if len(rooms) > 1 else "was"} {status}'
+    send_email(owner.email, subject, 'email/rooms_moderated.txt', owner=owner, rooms=rooms, status=status)
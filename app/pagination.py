@@ -0,0 +1,95 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import DateTime, tuple_
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    """Return the key values stored in cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, binascii.Error):
+        return None
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+
+    try:
+        return [
+            datetime.fromisoformat(value) if isinstance(key.type, DateTime) else value
+            for key, value in zip(keys, values)
+        ]
+    except (TypeError, ValueError):
+        return None
+
+
+def keyset_paginate(query, keys, after=None, before=None, per_page=None):
+    """Fetch one page of query ordered by keys, newest/highest first.
+
+    keys must end in a unique column (normally the primary key) so that
+    every row has a distinct position; rows inserted while a client is
+    paging never shift the pages it has not fetched yet.
+    """
+    per_page = per_page or current_app.config['PAGE_SIZE']
+
+    backwards = False
+    cursor = None
+    if before:
+        cursor = decode_cursor(before, keys)
+        backwards = cursor is not None
+    if cursor is None and after:
+        cursor = decode_cursor(after, keys)
+
+    query = query.add_columns(*keys).order_by(None)
+    if cursor is not None:
+        if backwards:
+            query = query.filter(tuple_(*keys) > tuple_(*cursor))
+        else:
+            query = query.filter(tuple_(*keys) < tuple_(*cursor))
+
+    if backwards:
+        query = query.order_by(*[key.asc() for key in keys])
+    else:
+        query = query.order_by(*[key.desc() for key in keys])
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage([])
+
+    first_key = encode_cursor(rows[0][1:])
+    last_key = encode_cursor(rows[-1][1:])
+    if backwards:
+        return KeysetPage([row[0] for row in rows], next_cursor=last_key, prev_cursor=first_key if has_more else None)
+    return KeysetPage(
+        [row[0] for row in rows],
+        next_cursor=last_key if has_more else None,
+        prev_cursor=first_key if cursor is not None else None
+    )
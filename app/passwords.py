@@ -0,0 +1,71 @@
+import threading
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_slots = {}
+_slots_lock = threading.Lock()
+_method_prefixes = {}
+
+
+class HashingBusy(ServiceUnavailable):
+    description = 'Too many logins at once. Please try again in a moment.'
+
+
+def get_slots(workers):
+    """Semaphore that caps how many hashes run at once.
+
+    The hash runs on the thread that asked for it; hashlib releases the
+    GIL while it derives keys, so several run in parallel. The cap keeps
+    a burst of logins from taking every core. It does not free request
+    threads: a thread waiting for a slot is still held.
+    """
+    with _slots_lock:
+        if workers not in _slots:
+            _slots[workers] = threading.BoundedSemaphore(workers)
+        return _slots[workers]
+
+
+def _run(func, *args):
+    """func(*args) once a hashing slot is free.
+
+    A request that cannot get one within PASSWORD_WAIT_TIMEOUT seconds is
+    answered 503 with Retry-After, rather than holding its thread in a
+    queue that only grows while logins keep arriving.
+    """
+    config = current_app.config
+    workers = config['PASSWORD_WORKERS']
+    if not workers:
+        return func(*args)
+    slots = get_slots(workers)
+    if not slots.acquire(timeout=config['PASSWORD_WAIT_TIMEOUT']):
+        raise HashingBusy(retry_after=1)
+    try:
+        return func(*args)
+    finally:
+        slots.release()
+
+
+def method_prefix(method):
+    """The fully parameterised form of method as it appears in stored hashes,
+    e.g. 'pbkdf2' -> 'pbkdf2:sha256:600000'"""
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+        _method_prefixes[method] = prefix
+    return prefix
+
+
+def hash_password(password):
+    config = current_app.config
+    return _run(generate_password_hash, password, config['PASSWORD_HASH_METHOD'],
+                config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """Whether pwhash was made with a different scheme or cost than configured"""
+    return pwhash.split('$', 1)[0] != method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
@@ -0,0 +1,126 @@
+import cProfile
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from app import db
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        # Statements run while a template renders are lazy loads
+        self.template_queries = 0
+        self.template_query_time = 0.0
+        self.template_time = 0.0
+        self.rendering = []
+
+
+def current_timing():
+    return g.get('request_timing') if has_request_context() else None
+
+
+def server_timing(timing, total):
+    """Server-Timing header value; template time excludes its lazy loads"""
+    db_time = timing.query_time - timing.template_query_time
+    template_time = timing.template_time - timing.template_query_time
+    return ', '.join((
+        f'db;dur={db_time * 1000:.1f};desc="{timing.queries - timing.template_queries} queries"',
+        f'lazy;dur={timing.template_query_time * 1000:.1f};desc="{timing.template_queries} queries in templates"',
+        f'tpl;dur={template_time * 1000:.1f};desc="Template rendering"',
+        f'app;dur={total * 1000:.1f};desc="Total"',
+    ))
+
+
+def register_profiling(app):
+    """Time SQL, template rendering and whole requests when PROFILING is on.
+
+    Adds a Server-Timing header to every response, logs statements slower
+    than SLOW_QUERY_MS and, if PROFILE_SAMPLE_RATE is N, saves a cProfile
+    of one request in N to PROFILE_DIR.
+    """
+    if not app.config['PROFILING']:
+        return
+
+    slow_query = app.config['SLOW_QUERY_MS'] / 1000
+    sample_rate = app.config['PROFILE_SAMPLE_RATE']
+    profile_dir = app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+    request_numbers = itertools.count(1)
+    counter_lock = threading.Lock()
+
+    def query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def query_finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        timing = current_timing()
+        if timing is not None:
+            timing.queries += 1
+            timing.query_time += elapsed
+            if timing.rendering:
+                timing.template_queries += 1
+                timing.template_query_time += elapsed
+        if elapsed >= slow_query:
+            route = request.endpoint if has_request_context() else '-'
+            app.logger.warning('Slow query (%.1f ms) in %s: %s %.500r', elapsed * 1000, route,
+                               ' '.join(statement.split()), parameters)
+
+    # Every engine the session can route to, including the read replica
+    with app.app_context():
+        engines = set(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', query_started)
+        event.listen(engine, 'after_cursor_execute', query_finished)
+
+    @before_render_template.connect_via(app)
+    def render_started(sender, template, context, **extra):
+        timing = current_timing()
+        if timing is not None:
+            timing.rendering.append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def render_finished(sender, template, context, **extra):
+        timing = current_timing()
+        if timing is not None and timing.rendering:
+            started = timing.rendering.pop()
+            # Only the outermost render counts, nested ones are inside it
+            if not timing.rendering:
+                timing.template_time += time.perf_counter() - started
+
+    @app.before_request
+    def start_timing():
+        g.request_timing = RequestTiming()
+        if sample_rate:
+            with counter_lock:
+                number = next(request_numbers)
+            if number % sample_rate == 0:
+                g.profiler = cProfile.Profile()
+                g.profiler.enable()
+
+    @app.after_request
+    def finish_timing(response):
+        timing = current_timing()
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing.started
+        response.headers['Server-Timing'] = server_timing(timing, total)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            name = f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.endpoint or "none"}-{total * 1000:.0f}ms.prof'
+            profiler.dump_stats(os.path.join(profile_dir, name))
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # after_request does not run when the view raised
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
@@ -0,0 +1,281 @@
+import calendar
+from datetime import date, datetime
+from sqlalchemy import delete, event, insert, select, update
+from app import db
+from app.models import Room, Booking, RoomMonthlyStat
+from app.stats import UPSERTS
+
+# Longest range the owner analytics will report on at once
+MAX_MONTHS = 36
+# By default the last 12 months and the next 3, where confirmed stays are coming up
+DEFAULT_MONTHS = 15
+UPCOMING_MONTHS = 3
+
+# A change to any of these can move a confirmed booking's nights or revenue
+TRACKED = ('status', 'room_id', 'start_date', 'end_date', 'total_price')
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def days_in(month):
+    return calendar.monthrange(month.year, month.month)[1]
+
+
+def split_by_month(start, end, total_price):
+    """[(month, nights, revenue, bookings)] for a stay from start to end.
+
+    The price is spread evenly over the nights and the booking itself is
+    counted in the month the stay starts.
+    """
+    price = total_price or 0
+    total_nights = (end - start).days
+    if total_nights <= 0:
+        return [(month_of(start), 0, price, 1)]
+
+    parts = []
+    day = start
+    while day < end:
+        next_month = add_months(month_of(day), 1)
+        parts.append([month_of(day), (min(end, next_month) - day).days])
+        day = next_month
+    shares = [round(price * nights / total_nights, 2) for _, nights in parts[:-1]]
+    # The last month takes the rounding remainder so the parts add up
+    shares.append(round(price - sum(shares), 2))
+    return [(month, nights, share, 1 if index == 0 else 0)
+            for index, ((month, nights), share) in enumerate(zip(parts, shares))]
+
+
+def _add_rows(connection, rows):
+    """Add each row's nights, revenue and bookings to its room and month"""
+    if not rows:
+        return
+    table = RoomMonthlyStat.__table__
+    deltas = ('nights', 'revenue', 'bookings')
+    upsert = UPSERTS.get(connection.dialect.name)
+    if upsert is not None:
+        statement = upsert(table)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['room_id', 'month'],
+            set_={name: table.c[name] + statement.excluded[name] for name in deltas}
+        ), rows)
+        return
+    for row in rows:
+        matched = connection.execute(
+            update(table).where(table.c.room_id == row['room_id'], table.c.month == row['month'])
+            .values(**{name: table.c[name] + row[name] for name in deltas})
+        ).rowcount
+        if not matched:
+            connection.execute(insert(table).values(**row))
+
+
+class Rollup:
+    """Totals per (room, month), collected before they are written"""
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, room_id, owner_id, start, end, total_price, sign=1):
+        for month, nights, revenue, bookings in split_by_month(start, end, total_price):
+            row = self.totals.setdefault((room_id, month), {
+                'room_id': room_id, 'month': month, 'owner_id': owner_id,
+                'nights': 0, 'revenue': 0, 'bookings': 0,
+            })
+            row['nights'] += sign * nights
+            row['revenue'] += sign * revenue
+            row['bookings'] += sign * bookings
+
+    def write(self, connection):
+        _add_rows(connection, list(self.totals.values()))
+        self.totals = {}
+
+
+def _owner_of(connection, room_id):
+    rooms = Room.__table__
+    return connection.scalar(select(rooms.c.owner_id).where(rooms.c.id == room_id))
+
+
+def _previous(booking, name):
+    history = db.inspect(booking).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(booking, name)
+
+
+def booking_inserted(mapper, connection, booking):
+    if booking.status == 'confirmed':
+        rollup = Rollup()
+        rollup.add(booking.room_id, _owner_of(connection, booking.room_id),
+                   booking.start_date, booking.end_date, booking.total_price)
+        rollup.write(connection)
+
+
+def booking_updated(mapper, connection, booking):
+    state = db.inspect(booking)
+    if not any(state.attrs[name].history.has_changes() for name in TRACKED):
+        return
+    rollup = Rollup()
+    if _previous(booking, 'status') == 'confirmed':
+        room_id = _previous(booking, 'room_id')
+        rollup.add(room_id, _owner_of(connection, room_id), _previous(booking, 'start_date'),
+                   _previous(booking, 'end_date'), _previous(booking, 'total_price'), sign=-1)
+    if booking.status == 'confirmed':
+        rollup.add(booking.room_id, _owner_of(connection, booking.room_id),
+                   booking.start_date, booking.end_date, booking.total_price)
+    rollup.write(connection)
+
+
+def booking_deleted(mapper, connection, booking):
+    if booking.status == 'confirmed':
+        rollup = Rollup()
+        rollup.add(booking.room_id, _owner_of(connection, booking.room_id),
+                   booking.start_date, booking.end_date, booking.total_price, sign=-1)
+        rollup.write(connection)
+
+
+def room_deleted(mapper, connection, room):
+    table = RoomMonthlyStat.__table__
+    connection.execute(delete(table).where(table.c.room_id == room.id))
+
+
+# The rollups change in the same transaction as the bookings, so a
+# rollback undoes both
+event.listen(Booking, 'after_insert', booking_inserted)
+event.listen(Booking, 'after_update', booking_updated)
+event.listen(Booking, 'after_delete', booking_deleted)
+# Before, so no rollup row is left pointing at a deleted room
+event.listen(Room, 'before_delete', room_deleted)
+
+
+def record_new_bookings(connection, rows):
+    """Roll up bookings added with a bulk INSERT, which skips mapper events.
+
+    rows are mappings with room_id, status, start_date, end_date and
+    total_price.
+    """
+    confirmed = [row for row in rows if row['status'] == 'confirmed']
+    if not confirmed:
+        return
+    rooms = Room.__table__
+    room_ids = {row['room_id'] for row in confirmed}
+    owners = dict(connection.execute(select(rooms.c.id, rooms.c.owner_id).where(rooms.c.id.in_(room_ids))).all())
+    rollup = Rollup()
+    for row in confirmed:
+        rollup.add(row['room_id'], owners[row['room_id']], row['start_date'], row['end_date'], row['total_price'])
+    rollup.write(connection)
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the confirmed bookings.
+
+    Bookings are read and added batch_size at a time in id order, so
+    memory stays flat however many there are. Everything happens in the
+    caller's transaction. Returns the number of bookings rolled up.
+    """
+    db.session.execute(delete(RoomMonthlyStat))
+    bookings = Booking.__table__
+    rooms = Room.__table__
+    connection = db.session.connection()
+    last_id = 0
+    processed = 0
+    while True:
+        batch = connection.execute(
+            select(bookings.c.id, bookings.c.room_id, rooms.c.owner_id, bookings.c.start_date,
+                   bookings.c.end_date, bookings.c.total_price)
+            .join(rooms, rooms.c.id == bookings.c.room_id)
+            .where(bookings.c.status == 'confirmed', bookings.c.id > last_id)
+            .order_by(bookings.c.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return processed
+        rollup = Rollup()
+        for row in batch:
+            rollup.add(row.room_id, row.owner_id, row.start_date, row.end_date, row.total_price)
+        rollup.write(connection)
+        last_id = batch[-1].id
+        processed += len(batch)
+
+
+def parse_period(start=None, end=None, today=None):
+    """(first, last) months from YYYY-MM strings, each inclusive.
+
+    Without them the period is DEFAULT_MONTHS long and ends
+    UPCOMING_MONTHS after this one. Raises ValueError for bad input.
+    """
+    this_month = month_of(today or datetime.utcnow().date())
+    try:
+        last = datetime.strptime(end, '%Y-%m').date() if end else add_months(this_month, UPCOMING_MONTHS)
+        first = datetime.strptime(start, '%Y-%m').date() if start else add_months(last, 1 - DEFAULT_MONTHS)
+    except ValueError:
+        raise ValueError('from and to must be YYYY-MM months')
+    if first > last:
+        raise ValueError('from must not be after to')
+    if add_months(first, MAX_MONTHS) <= last:
+        raise ValueError(f'At most {MAX_MONTHS} months at a time')
+    return first, last
+
+
+def _summary(nights, revenue, bookings, available_nights):
+    return {
+        'nights': nights,
+        'revenue': round(revenue, 2),
+        'bookings': bookings,
+        'occupancy': round(nights / available_nights, 4) if available_nights else 0.0,
+    }
+
+
+def owner_report(owner_id, first, last):
+    """Nights, revenue, bookings and occupancy of an owner's rooms from
+    month first to month last, per room, per month and in total.
+
+    Occupancy is confirmed nights over the nights the rooms could have
+    been let in the period.
+    """
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    period_nights = (add_months(last, 1) - first).days
+
+    rooms = db.session.execute(
+        select(Room.id, Room.title).where(Room.owner_id == owner_id).order_by(Room.id)
+    ).all()
+    rows = db.session.execute(
+        select(RoomMonthlyStat.room_id, RoomMonthlyStat.month, RoomMonthlyStat.nights,
+               RoomMonthlyStat.revenue, RoomMonthlyStat.bookings)
+        .where(RoomMonthlyStat.owner_id == owner_id, RoomMonthlyStat.month >= first,
+               RoomMonthlyStat.month <= last)
+    ).all()
+
+    by_room = {room_id: [0, 0, 0] for room_id, _ in rooms}
+    by_month = {month: [0, 0, 0] for month in months}
+    for room_id, month, nights, revenue, bookings in rows:
+        for totals in (by_room.setdefault(room_id, [0, 0, 0]), by_month[month]):
+            totals[0] += nights
+            totals[1] += revenue
+            totals[2] += bookings
+
+    titles = dict(rooms)
+    return {
+        'from': first,
+        'to': last,
+        'rooms': [
+            dict(_summary(*totals, period_nights), room_id=room_id, title=titles.get(room_id))
+            for room_id, totals in by_room.items()
+        ],
+        'months': [
+            dict(_summary(*totals, days_in(month) * len(rooms)), month=month)
+            for month, totals in by_month.items()
+        ],
+        'total': _summary(
+            sum(totals[0] for totals in by_month.values()),
+            sum(totals[1] for totals in by_month.values()),
+            sum(totals[2] for totals in by_month.values()),
+            period_nights * len(rooms),
+        ),
+    }
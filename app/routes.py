@@ -1,12 +1,22 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, g, current_app, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.utils import secure_filename
-from app import db
+from sqlalchemy.orm import joinedload, contains_eager
+from app import db, response_cache, metrics
 from app.models import User, Room, Booking, Review
-from app.forms import RegistrationForm, LoginForm, RoomForm, BookingForm, ReviewForm
-from datetime import datetime ,date
+from app.search import search_rooms
+from app.geo import filter_by_geo, resolve_coordinates, distance_km
+from app.facets import available_on, cached_facet_counts, price_between
+from app import stats
+from app import moderation, notifications, revenue
+from app.pagination import keyset_paginate
+from app.database import read_only
+from app.images import queue_room_image, queue_profile_image
+from app.uploads import upload_lock, save_upload, release_upload
+from app.availability import DatesUnavailable, conflict_message, reserve_dates, release_dates
+from app.forms import RegistrationForm, LoginForm, RoomForm, BookingForm, ReviewForm, ModerationForm
+from contextlib import nullcontext
+from datetime import datetime ,date, timedelta
 from app.forms import ProfileForm  ,ResetPasswordForm
-import os
 
 
 def allowed_file(filename):
@@ -17,15 +27,21 @@ def register_context_processor(app):
     @app.context_processor
     def utility_processor():
         def pending_bookings_count():
-            if current_user.is_authenticated and current_user.role == 'owner':
-                owner_rooms = Room.query.filter_by(owner_id=current_user.id).all()
-                room_ids = [room.id for room in owner_rooms]
-                return Booking.query.filter(
-                    Booking.room_id.in_(room_ids), 
-                    Booking.status == 'pending'
-                ).count()
-            return 0
-        return dict(pending_bookings_count=pending_bookings_count)
+            if 'pending_bookings_count' not in g:
+                if current_user.is_authenticated and current_user.role == 'owner':
+                    g.pending_bookings_count = current_user.pending_bookings_count
+                else:
+                    g.pending_bookings_count = 0
+            return g.pending_bookings_count
+
+        def page_url(**cursor):
+            args = request.args.to_dict()
+            args.pop('after', None)
+            args.pop('before', None)
+            args.update(cursor)
+            return url_for(request.endpoint, **request.view_args, **args)
+
+        return dict(pending_bookings_count=pending_bookings_count, page_url=page_url)
 
 
 def register_routes(app):
@@ -33,6 +49,8 @@ def register_routes(app):
     register_context_processor(app)
 
     @app.route('/')
+    @response_cache.cached(tags=('rooms',))
+    @read_only
     def index():
         rooms = Room.query.filter_by(status='approved').order_by(Room.created_at.desc()).limit(6).all()
         return render_template('index.html', rooms=rooms)
@@ -69,6 +87,12 @@ def register_routes(app):
             user = User.query.filter_by(email=form.email.data).first()
 
             if user and user.check_password(form.password.data):
+                # Upgrade hashes made with an older scheme or cost while
+                # the plaintext is at hand
+                if user.password_needs_rehash():
+                    user.set_password(form.password.data)
+                    db.session.commit()
+
                 login_user(user)
                 flash(f'Welcome back, {user.name}!', 'success')
 
@@ -93,17 +117,35 @@ def register_routes(app):
         role = current_user.role  
 
         if role == 'admin':
-            pending_rooms = Room.query.filter_by(status='pending').all()
-            total_users = User.query.count()
-            total_rooms = Room.query.count()
-            total_bookings = Booking.query.count()
+            owner = request.args.get('owner', '').strip()
+            older_than = request.args.get('older_than', type=int)
+            pending_query = Room.query.filter_by(status='pending').join(Room.owner).options(contains_eager(Room.owner))
+            if owner:
+                pattern = f'%{owner}%'
+                pending_query = pending_query.filter(db.or_(User.email.ilike(pattern), User.name.ilike(pattern)))
+            if older_than:
+                pending_query = pending_query.filter(Room.created_at <= datetime.utcnow() - timedelta(days=older_than))
+            page = keyset_paginate(
+                pending_query,
+                [Room.created_at, Room.id],
+                after=request.args.get('after'),
+                before=request.args.get('before'),
+                per_page=current_app.config['MODERATION_PAGE_SIZE']
+            )
+            # Running counters instead of COUNT(*) over the base tables
+            counters = stats.counters()
 
             return render_template(
                 'admin_panel.html',
-                pending_rooms=pending_rooms,
-                total_users=total_users,
-                total_rooms=total_rooms,
-                total_bookings=total_bookings,
+                pending_rooms=page.items,
+                pending_count=counters['rooms'].get('pending', 0),
+                page=page,
+                total_users=counters['users']['total'],
+                total_rooms=counters['rooms']['total'],
+                total_bookings=counters['bookings']['total'],
+                counters=counters,
+                series=stats.daily_series(30),
+                moderation_form=ModerationForm(),
                 user=current_user,
                 role=role
             )
@@ -118,7 +160,7 @@ def register_routes(app):
             )
         
         if role == 'viewer':
-            my_bookings = Booking.query.filter_by(renter_id=current_user.id).all()
+            my_bookings = Booking.query.options(joinedload(Booking.room)).filter_by(renter_id=current_user.id).all()
             return render_template(
                 'viewer_booking.html',
                 bookings=my_bookings,
@@ -136,28 +178,33 @@ def register_routes(app):
         form = RoomForm()
         if form.validate_on_submit():
             filename = 'default_room.jpg'
+            latitude, longitude = resolve_coordinates(form.location.data, form.latitude.data, form.longitude.data)
+
+            new_image = form.image.data and allowed_file(form.image.data.filename)
+            # Until the room is committed nothing references the upload
+            with upload_lock() if new_image else nullcontext():
+                if new_image:
+                    filename = save_upload(form.image.data)
+
+                room = Room(
+                    owner_id=current_user.id,
+                    title=form.title.data,
+                    location=form.location.data,
+                    latitude=latitude,
+                    longitude=longitude,
+                    rent_price=form.rent_price.data,
+                    room_type=form.room_type.data,
+                    description=form.description.data,
+                    image_filename=filename,
+                    available_from=form.available_from.data,
+                    available_to=form.available_to.data,
+                    status='pending' if current_user.role != 'admin' else 'approved'
+                )
 
-            if form.image.data and allowed_file(form.image.data.filename):
-                file = form.image.data
-                filename = secure_filename(file.filename)
-                filename = f"{int(datetime.now().timestamp())}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-
-            room = Room(
-                owner_id=current_user.id,
-                title=form.title.data,
-                location=form.location.data,
-                rent_price=form.rent_price.data,
-                room_type=form.room_type.data,
-                description=form.description.data,
-                image_filename=filename,
-                available_from=form.available_from.data,
-                available_to=form.available_to.data,
-                status='pending' if current_user.role != 'admin' else 'approved'
-            )
-
-            db.session.add(room)
-            db.session.commit()
+                db.session.add(room)
+                db.session.commit()
+            if filename != 'default_room.jpg':
+                queue_room_image(room)
 
             flash('Room listing submitted successfully!', 'success')
             return redirect(url_for('dashboard'))
@@ -165,30 +212,60 @@ def register_routes(app):
         return render_template('add_room.html', form=form)
 
     @app.route('/rooms')
+    @response_cache.cached(tags=('rooms',))
+    @read_only
     def room_list():
         location = request.args.get('location', '')
         room_type = request.args.get('room_type', '')
         min_price = request.args.get('min_price', type=float)
         max_price = request.args.get('max_price', type=float)
+        price_below = request.args.get('price_below', type=float)
+        available = request.args.get('available') == '1'
 
         query = Room.query.filter_by(status='approved')
+        sort_keys = [Room.created_at, Room.id]
 
         if location:
-            query = query.filter(Room.location.contains(location))
+            query, score = search_rooms(query, location)
+            if score is not None:
+                sort_keys = [score, Room.id]
+
+        query, proximity, origin, error = filter_by_geo(query, request.args)
+        if error:
+            flash(error, 'warning')
+        elif proximity is not None:
+            sort_keys = [proximity, Room.id]
+
+        # Counted before the faceted filters, which facet_counts applies itself
+        facets = cached_facet_counts(query, request.args, room_type=room_type, min_price=min_price,
+                                     max_price=max_price, price_below=price_below, available=available)
         if room_type:
-            query = query.filter_by(room_type=room_type)
-        if min_price:
-            query = query.filter(Room.rent_price >= min_price)
-        if max_price:
-            query = query.filter(Room.rent_price <= max_price)
-
-        rooms = query.all()
-        return render_template('room_list.html', rooms=rooms)
+            query = query.filter(Room.room_type == room_type)
+        query = query.filter(price_between(min_price, max_price, price_below))
+        if available:
+            query = query.filter(available_on(date.today()))
+
+        page = keyset_paginate(
+            query,
+            sort_keys,
+            after=request.args.get('after'),
+            before=request.args.get('before')
+        )
+        distances = {}
+        if origin is not None:
+            distances = {
+                room.id: distance_km(origin[0], origin[1], room.latitude, room.longitude)
+                for room in page.items
+            }
+        return render_template('room_list.html', rooms=page.items, page=page, distances=distances, facets=facets,
+                               selected_price=None if max_price else (min_price, price_below))
 
     @app.route('/room/<int:room_id>')
+    @response_cache.cached(tags=lambda room_id: (f'room:{room_id}',))
+    @read_only
     def room_details(room_id):
-        room = Room.query.get_or_404(room_id)
-        reviews = Review.query.filter_by(room_id=room_id).order_by(Review.created_at.desc()).all()
+        room = Room.query.options(joinedload(Room.owner)).filter_by(id=room_id).first_or_404()
+        reviews = Review.query.options(joinedload(Review.reviewer)).filter_by(room_id=room_id).order_by(Review.created_at.desc()).all()
         
         existing_bookings = Booking.query.filter(
             Booking.room_id == room_id,
@@ -228,12 +305,20 @@ def register_routes(app):
                 )
 
                 db.session.add(booking)
-                db.session.commit()
-                flash('Booking request submitted! Waiting for owner approval.', 'success')
-                return redirect(url_for('dashboard'))
-            else:
-              
-                flash('Cannot book room for the selected dates. Please check the errors below.', 'danger')
+                try:
+                    reserve_dates(booking)
+                except DatesUnavailable as e:
+                    form.start_date.errors.append(conflict_message(e.conflict))
+                else:
+                    notifications.booking_requested(booking)
+                    db.session.commit()
+                    # The dates are taken, so "available" listings and counts change
+                    response_cache.invalidate('rooms', f'room:{room_id}')
+                    metrics.inc('bookings_total', event='created')
+                    flash('Booking request submitted! Waiting for owner approval.', 'success')
+                    return redirect(url_for('dashboard'))
+
+            flash('Cannot book room for the selected dates. Please check the errors below.', 'danger')
 
         return render_template('booking.html', room=room, form=form, existing_bookings=existing_bookings ,min_date=min_date)
 
@@ -258,6 +343,7 @@ def register_routes(app):
             )
             db.session.add(review)
             db.session.commit()
+            response_cache.invalidate('rooms', f'room:{room_id}')
 
             flash('Review added!', 'success')
             return redirect(url_for('room_details', room_id=room_id))
@@ -272,12 +358,52 @@ def register_routes(app):
             return redirect(url_for('index'))
 
         room = Room.query.get_or_404(room_id)
+        if room.status != 'approved':
+            # In the same transaction, like the bulk moderation
+            notifications.rooms_decided([{'id': room.id, 'owner_id': room.owner_id}], 'approved')
         room.status = 'approved'
         db.session.commit()
+        response_cache.invalidate('rooms', f'room:{room_id}')
 
         flash(f'Room "{room.title}" approved!', 'success')
         return redirect(url_for('dashboard'))
 
+    @app.route('/admin/rooms/moderate', methods=['POST'])
+    @login_required
+    def moderate_rooms():
+        wants_json = request.accept_mimetypes.best == 'application/json'
+        if current_user.role != 'admin':
+            if wants_json:
+                return jsonify(error='Admin access required.'), 403
+            flash('Admin access required.', 'danger')
+            return redirect(url_for('index'))
+
+        back = url_for('dashboard', owner=request.form.get('owner') or None,
+                       older_than=request.form.get('older_than') or None)
+        form = ModerationForm()
+        if not form.validate_on_submit():
+            message = next(iter(form.errors.values()))[0]
+            if wants_json:
+                return jsonify(error=message), 400
+            flash(message, 'danger')
+            return redirect(back)
+
+        status = moderation.ACTIONS[form.action.data]
+        outcomes = moderation.moderate_rooms(form.room_ids.data, status)
+        if wants_json:
+            return jsonify(results=[{'id': room_id, 'outcome': outcome} for room_id, outcome in outcomes.items()])
+
+        done = sum(1 for outcome in outcomes.values() if outcome == status)
+        skipped = sum(1 for outcome in outcomes.values() if outcome.startswith('already'))
+        missing = len(outcomes) - done - skipped
+        message = f'{done} room{"s" if done != 1 else ""} {status}.'
+        if skipped:
+            message += f' {skipped} had already been moderated.'
+        if missing:
+            message += f' {missing} no longer exist.'
+        flash(message, 'success' if done else 'warning')
+        return redirect(back)
+
     @app.route('/reject/<int:room_id>')
     @login_required
     def reject_room(room_id):
@@ -286,8 +412,12 @@ def register_routes(app):
             return redirect(url_for('index'))
 
         room = Room.query.get_or_404(room_id)
+        if room.status != 'rejected':
+            # In the same transaction, like the bulk moderation
+            notifications.rooms_decided([{'id': room.id, 'owner_id': room.owner_id}], 'rejected')
         room.status = 'rejected'
         db.session.commit()
+        response_cache.invalidate('rooms', f'room:{room_id}')
 
         flash(f'Room "{room.title}" rejected.', 'warning')
         return redirect(url_for('dashboard'))
@@ -301,8 +431,11 @@ def register_routes(app):
             flash('You do not have permission to delete this room.', 'danger')
             return redirect(url_for('dashboard'))
 
+        image_filename = room.image_filename
         db.session.delete(room)
         db.session.commit()
+        release_upload(image_filename)
+        response_cache.invalidate('rooms', f'room:{room_id}')
 
         flash('Room deleted successfully.', 'success')
         return redirect(url_for('dashboard'))
@@ -317,7 +450,10 @@ def register_routes(app):
             return redirect(url_for('dashboard'))
 
         booking.status = 'cancelled'
+        release_dates(booking)
         db.session.commit()
+        response_cache.invalidate('rooms', f'room:{booking.room_id}')
+        metrics.inc('bookings_total', event='cancelled')
 
         flash('Booking cancelled.', 'info')
         return redirect(url_for('dashboard'))
@@ -334,22 +470,33 @@ def register_routes(app):
         form = RoomForm(obj=room)
 
         if form.validate_on_submit():
+            location_changed = form.location.data != room.location
+            coordinates_kept = (form.latitude.data, form.longitude.data) == (room.latitude, room.longitude)
             room.title = form.title.data
             room.location = form.location.data
+            if location_changed and coordinates_kept:
+                room.latitude, room.longitude = resolve_coordinates(room.location, None, None)
+            else:
+                room.latitude, room.longitude = form.latitude.data, form.longitude.data
             room.rent_price = form.rent_price.data
             room.room_type = form.room_type.data
             room.description = form.description.data
             room.available_from = form.available_from.data
             room.available_to = form.available_to.data
 
-            if form.image.data and allowed_file(form.image.data.filename):
-                file = form.image.data
-                filename = secure_filename(file.filename)
-                filename = f"{int(datetime.now().timestamp())}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                room.image_filename = filename
+            old_image = room.image_filename
+            new_image = form.image.data and allowed_file(form.image.data.filename)
+            with upload_lock() if new_image else nullcontext():
+                if new_image:
+                    room.image_filename = save_upload(form.image.data)
+                    if room.image_filename != old_image:
+                        room.image_variants = None
 
-            db.session.commit()
+                db.session.commit()
+            response_cache.invalidate('rooms', f'room:{room_id}')
+            if new_image and room.image_filename != old_image:
+                release_upload(old_image)
+                queue_room_image(room)
             flash('Room updated successfully!', 'success')
 
             return redirect(url_for('dashboard'))
@@ -363,12 +510,35 @@ def register_routes(app):
             flash('Only room owners can access this page.', 'danger')
             return redirect(url_for('dashboard'))
         
-        owner_rooms = Room.query.filter_by(owner_id=current_user.id).all()
+        query = Booking.query.join(Booking.room).filter(
+            Room.owner_id == current_user.id
+        ).options(
+            joinedload(Booking.room),
+            joinedload(Booking.renter)
+        )
+        page = keyset_paginate(
+            query,
+            [Booking.created_at, Booking.id],
+            after=request.args.get('after'),
+            before=request.args.get('before')
+        )
         
-        room_ids = [room.id for room in owner_rooms]
-        bookings = Booking.query.filter(Booking.room_id.in_(room_ids)).order_by(Booking.created_at.desc()).all()
-        
-        return render_template('owner_bookings.html', bookings=bookings)
+        return render_template('owner_bookings.html', bookings=page.items, page=page)
+
+    @app.route('/owner/analytics')
+    @login_required
+    def owner_analytics():
+        if current_user.role != 'owner':
+            flash('Only room owners can access this page.', 'danger')
+            return redirect(url_for('dashboard'))
+
+        try:
+            first, last = revenue.parse_period(request.args.get('from'), request.args.get('to'))
+        except ValueError as e:
+            flash(str(e), 'warning')
+            first, last = revenue.parse_period()
+        report = revenue.owner_report(current_user.id, first, last)
+        return render_template('owner_analytics.html', report=report)
 
     @app.route('/owner/booking/<int:booking_id>/approve')
     @login_required
@@ -389,7 +559,10 @@ def register_routes(app):
         
         booking.status = 'confirmed'
         booking.updated_at = datetime.utcnow()
+        notifications.booking_decided(booking)
         db.session.commit()
+        response_cache.invalidate('rooms', f'room:{booking.room_id}')
+        metrics.inc('bookings_total', event='approved')
         
         flash('Booking approved successfully!', 'success')
         return redirect(url_for('owner_bookings'))
@@ -413,7 +586,11 @@ def register_routes(app):
         
         booking.status = 'rejected'
         booking.updated_at = datetime.utcnow()
+        release_dates(booking)
+        notifications.booking_decided(booking)
         db.session.commit()
+        response_cache.invalidate('rooms', f'room:{booking.room_id}')
+        metrics.inc('bookings_total', event='rejected')
         
         flash('Booking rejected.', 'info')
         return redirect(url_for('owner_bookings'))
@@ -432,13 +609,17 @@ def register_routes(app):
                 file = request.files['photo']
                 
                 if file.filename != '':
-                    filename = secure_filename(file.filename)
-                    filename = f"{int(datetime.now().timestamp())}_{filename}"
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-
-                    current_user.profile_image = filename
-                    db.session.commit()
+                    old_image = current_user.profile_image
+                    with upload_lock():
+                        filename = save_upload(file)
+                        if filename != old_image:
+                            current_user.profile_image = filename
+                            current_user.profile_image_variants = None
+                            db.session.commit()
+
+                    if filename != old_image:
+                        release_upload(old_image)
+                        queue_profile_image(current_user)
 
                     flash("Profile photo updated successfully!", "success")
                     return redirect(url_for('profile'))
@@ -473,14 +654,14 @@ def register_routes(app):
     @login_required
     def view_room(room_id):
         """View room details for users"""
-        room = Room.query.get_or_404(room_id)
+        room = Room.query.options(joinedload(Room.owner)).filter_by(id=room_id).first_or_404()
         
         if room.status != 'approved' and current_user.id != room.owner_id and current_user.role != 'admin':
             flash('This room is not available for viewing.', 'danger')
             return redirect(url_for('room_list'))
         
        
-        reviews = Review.query.filter_by(room_id=room_id).order_by(Review.created_at.desc()).all()
+        reviews = Review.query.options(joinedload(Review.reviewer)).filter_by(room_id=room_id).order_by(Review.created_at.desc()).all()
         
         existing_bookings = Booking.query.filter(
             Booking.room_id == room_id,
@@ -501,14 +682,17 @@ def register_routes(app):
                             booking=user_booking)
     
     @app.route('/about')
+    @response_cache.cached()
     def about_us():
         return render_template('about_us.html')
     
     @app.route('/term')
+    @response_cache.cached()
     def term():
         return render_template('term_services.html')
     
     @app.route('/privacy')
+    @response_cache.cached()
     def privacy_policy():
         return render_template('privacy_policy.html')
     
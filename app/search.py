@@ -0,0 +1,104 @@
+import re
+from sqlalchemy import DDL, Float, event, literal_column, or_, select, text
+from app import db
+from app.models import Room
+
+# Column weights for bm25(): a hit in the title outranks one in the
+# location, which outranks one buried in the description. bm25() is
+# lower for better matches, so it is negated into a descending score.
+SCORE_EXPRESSION = '-bm25(rooms_fts, 10.0, 5.0, 1.0)'
+
+create_rooms_fts = DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS rooms_fts USING fts5("
+    "title, location, description, tokenize='unicode61 remove_diacritics 2')"
+)
+event.listen(Room.__table__, 'after_create', create_rooms_fts.execute_if(dialect='sqlite'))
+
+
+def is_fts_enabled(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def build_match_query(terms):
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    words = re.findall(r'\w+', terms)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_rooms(query, terms):
+    """Restrict a Room query to rooms matching terms.
+
+    Returns the filtered query and a relevance score column to sort on
+    (higher is better), or None when the database has no FTS index.
+    """
+    if not is_fts_enabled(db.session.connection()):
+        pattern = f'%{terms}%'
+        return query.filter(or_(
+            Room.title.ilike(pattern),
+            Room.location.ilike(pattern),
+            Room.description.ilike(pattern)
+        )), None
+
+    match = build_match_query(terms)
+    if not match:
+        return query, None
+
+    ranked = select(
+        literal_column('rowid').label('room_id'),
+        literal_column(SCORE_EXPRESSION, type_=Float).label('score')
+    ).select_from(text('rooms_fts')).where(
+        text('rooms_fts MATCH :match').bindparams(match=match)
+    ).subquery()
+
+    return query.join(ranked, ranked.c.room_id == Room.id), ranked.c.score
+
+
+def index_room(connection, room):
+    connection.execute(text('DELETE FROM rooms_fts WHERE rowid = :id'), {'id': room.id})
+    if room.status == 'approved':
+        connection.execute(
+            text('INSERT INTO rooms_fts (rowid, title, location, description) '
+                 'VALUES (:id, :title, :location, :description)'),
+            {'id': room.id, 'title': room.title, 'location': room.location, 'description': room.description or ''}
+        )
+
+
+def index_new_rooms(connection, rooms):
+    """Index rooms added with a bulk INSERT, which skips mapper events.
+
+    rooms are mappings with id, title, location, description and status.
+    """
+    if not is_fts_enabled(connection):
+        return
+    rows = [
+        {'id': room['id'], 'title': room['title'], 'location': room['location'],
+         'description': room['description'] or ''}
+        for room in rooms if room['status'] == 'approved'
+    ]
+    if rows:
+        connection.execute(
+            text('INSERT INTO rooms_fts (rowid, title, location, description) '
+                 'VALUES (:id, :title, :location, :description)'),
+            rows
+        )
+
+
+@event.listens_for(Room, 'after_insert')
+def room_inserted(mapper, connection, room):
+    if is_fts_enabled(connection):
+        index_room(connection, room)
+
+
+@event.listens_for(Room, 'after_update')
+def room_updated(mapper, connection, room):
+    if not is_fts_enabled(connection):
+        return
+    state = db.inspect(room)
+    if any(state.attrs[name].history.has_changes() for name in ('title', 'location', 'description', 'status')):
+        index_room(connection, room)
+
+
+@event.listens_for(Room, 'after_delete')
+def room_deleted(mapper, connection, room):
+    if is_fts_enabled(connection):
+        connection.execute(text('DELETE FROM rooms_fts WHERE rowid = :id'), {'id': room.id})
@@ -0,0 +1,40 @@
+// Toggle mobile menu
+function toggleMobileMenu() {
+    const navMenu = document.getElementById('navMenu');
+    navMenu.classList.toggle('active');
+}
+
+// Toggle user dropdown
+function toggleUserMenu() {
+    document.getElementById('userDropdown').classList.toggle('hidden');
+}
+
+// Close dropdowns when clicking outside
+window.addEventListener('click', function(e) {
+    // Close user dropdown
+    if (!e.target.closest('.user-menu')) {
+        document.getElementById('userDropdown').classList.add('hidden');
+    }
+
+    // Close mobile menu when clicking on link
+    if (e.target.closest('.nav-link') && window.innerWidth <= 768) {
+        document.getElementById('navMenu').classList.remove('active');
+    }
+});
+
+// Close mobile menu on resize
+window.addEventListener('resize', function() {
+    if (window.innerWidth > 768) {
+        document.getElementById('navMenu').classList.remove('active');
+    }
+});
+
+// Auto-hide flash messages after 5 seconds
+document.addEventListener('DOMContentLoaded', function() {
+    setTimeout(function() {
+        const alerts = document.querySelectorAll('.alert');
+        alerts.forEach(function(alert) {
+            alert.style.display = 'none';
+        });
+    }, 5000);
+});
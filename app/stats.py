@@ -0,0 +1,145 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import User, Room, Booking, StatCounter, DailyStat
+
+# Counters kept per value of one column: 'users.owner', 'rooms.pending', ...
+COUNTED = {User: ('users', 'role'), Room: ('rooms', 'status'), Booking: ('bookings', 'status')}
+# Rows created per day, by created_at
+DAILY = {User: 'new_users', Room: 'new_rooms', Booking: 'new_bookings'}
+
+UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _add(connection, table, keys, delta):
+    """value += delta on the row with keys, creating it if needed"""
+    upsert = UPSERTS.get(connection.dialect.name)
+    if upsert is not None:
+        statement = upsert(table).values(**keys, value=delta)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(keys), set_={'value': table.c.value + statement.excluded.value}
+        ))
+        return
+    matched = connection.execute(
+        update(table).where(*[table.c[name] == value for name, value in keys.items()])
+        .values(value=table.c.value + delta)
+    ).rowcount
+    if not matched:
+        connection.execute(insert(table).values(**keys, value=delta))
+
+
+def add_to_counter(connection, name, delta):
+    if delta:
+        _add(connection, StatCounter.__table__, {'name': name}, delta)
+
+
+def add_to_daily(connection, name, day, delta):
+    if delta:
+        _add(connection, DailyStat.__table__, {'day': day, 'name': name}, delta)
+
+
+def _day(created_at):
+    return (created_at or datetime.utcnow()).date()
+
+
+def row_inserted(mapper, connection, target):
+    prefix, column = COUNTED[mapper.class_]
+    add_to_counter(connection, f'{prefix}.{getattr(target, column)}', 1)
+    add_to_daily(connection, DAILY[mapper.class_], _day(target.created_at), 1)
+
+
+def row_updated(mapper, connection, target):
+    prefix, column = COUNTED[mapper.class_]
+    history = db.inspect(target).attrs[column].history
+    if history.deleted and history.added and history.deleted[0] != history.added[0]:
+        add_to_counter(connection, f'{prefix}.{history.deleted[0]}', -1)
+        add_to_counter(connection, f'{prefix}.{history.added[0]}', 1)
+
+
+def row_deleted(mapper, connection, target):
+    prefix, column = COUNTED[mapper.class_]
+    add_to_counter(connection, f'{prefix}.{getattr(target, column)}', -1)
+
+
+# Counters change in the same transaction as the rows they count, so a
+# rollback undoes both
+for model in COUNTED:
+    event.listen(model, 'after_insert', row_inserted)
+    event.listen(model, 'after_update', row_updated)
+    event.listen(model, 'after_delete', row_deleted)
+
+
+def record_new_rows(connection, model, rows):
+    """Count rows added with a bulk INSERT, which skips mapper events.
+
+    rows are mappings with the counted column and created_at.
+    """
+    prefix, column = COUNTED[model]
+    counts = {}
+    days = {}
+    for row in rows:
+        counts[row[column]] = counts.get(row[column], 0) + 1
+        days[_day(row['created_at'])] = days.get(_day(row['created_at']), 0) + 1
+    for value, count in counts.items():
+        add_to_counter(connection, f'{prefix}.{value}', count)
+    for day, count in days.items():
+        add_to_daily(connection, DAILY[model], day, count)
+
+
+def rebuild():
+    """Recompute every counter and daily series from the base tables.
+
+    A full scan of each table; for after bulk writes that bypass the ORM
+    or to repair drift, not for request handling.
+    """
+    db.session.execute(delete(StatCounter))
+    db.session.execute(delete(DailyStat))
+
+    counters = []
+    for model, (prefix, column) in COUNTED.items():
+        grouped = getattr(model, column)
+        for value, count in db.session.execute(select(grouped, func.count()).group_by(grouped)):
+            counters.append({'name': f'{prefix}.{value}', 'value': count})
+    if counters:
+        db.session.execute(insert(StatCounter), counters)
+
+    daily = []
+    for model, name in DAILY.items():
+        day = func.date(model.created_at)
+        rows = db.session.execute(
+            select(day, func.count()).where(model.created_at.isnot(None)).group_by(day)
+        )
+        for value, count in rows:
+            # SQLite returns dates as text
+            daily.append({'day': value if isinstance(value, date) else date.fromisoformat(value),
+                          'name': name, 'value': count})
+    if daily:
+        db.session.execute(insert(DailyStat), daily)
+
+
+def counters():
+    """{'users': {'total': n, 'owner': n, ...}, 'rooms': {...}, 'bookings': {...}}"""
+    summary = {prefix: {'total': 0} for prefix, _ in COUNTED.values()}
+    for name, value in db.session.execute(select(StatCounter.name, StatCounter.value)):
+        prefix, _, key = name.partition('.')
+        if prefix in summary:
+            summary[prefix][key] = value
+            summary[prefix]['total'] += value
+    return summary
+
+
+def daily_series(days=30, today=None):
+    """The last days of each daily series as {'days': [...], name: [...]}, oldest first"""
+    today = today or datetime.utcnow().date()
+    first = today - timedelta(days=days - 1)
+    calendar = [first + timedelta(days=offset) for offset in range(days)]
+    series = {name: dict.fromkeys(calendar, 0) for name in DAILY.values()}
+    rows = db.session.execute(
+        select(DailyStat.day, DailyStat.name, DailyStat.value)
+        .where(DailyStat.day >= first, DailyStat.day <= today)
+    )
+    for day, name, value in rows:
+        if name in series:
+            series[name][day] = value
+    return dict({name: list(values.values()) for name, values in series.items()}, days=calendar)
@@ -0,0 +1,199 @@
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+from app import db
+from app.models import User, Room, Booking, BookedDate, Review
+from app.availability import days_between
+from app.passwords import hash_password
+from app.search import index_new_rooms
+from app.geo import lookup_place, index_new_room_locations
+from app.stats import record_new_rows
+from app.revenue import record_new_bookings
+
+# Every generated account shares this password so benchmarks can log in
+PASSWORD = 'password123'
+
+LOCATIONS = (
+    'Thamel, Kathmandu', 'Baneshwor, Kathmandu', 'Koteshwor, Kathmandu', 'Kalanki, Kathmandu',
+    'Maharajgunj, Kathmandu', 'Baluwatar, Kathmandu', 'Chabahil, Kathmandu', 'Boudha, Kathmandu',
+    'Jawalakhel, Lalitpur', 'Pulchowk, Lalitpur', 'Kupondole, Lalitpur', 'Satdobato, Lalitpur',
+    'Suryabinayak, Bhaktapur', 'Thimi, Bhaktapur', 'Lakeside, Pokhara', 'Chipledhunga, Pokhara',
+    'Dharan', 'Biratnagar', 'Butwal', 'Chitwan',
+)
+# Typical monthly rent for each room type, in Rs
+ROOM_TYPES = {
+    'Single Room': 6000,
+    'Attached Room': 9000,
+    'Single Room and Kitchen Room': 11000,
+    'Apartment': 25000,
+}
+ADJECTIVES = ('Sunny', 'Spacious', 'Quiet', 'Cozy', 'Furnished', 'Bright', 'Modern', 'Affordable')
+COMMENTS = (
+    'Great place, friendly owner.', 'Clean and quiet.', 'A bit noisy at night.', 'Good value for money.',
+    'Water supply was irregular.', 'Close to everything.', 'Would rent again.', None,
+)
+# Share of rooms in each moderation state
+ROOM_STATUSES = (('approved', 0.85), ('pending', 0.10), ('rejected', 0.05))
+# What happened to bookings that did not overlap an earlier one
+BOOKING_OUTCOMES = (('confirmed', 0.55), ('pending', 0.25), ('cancelled', 0.12), ('rejected', 0.08))
+RATINGS = ((5, 0.40), (4, 0.32), (3, 0.15), (2, 0.08), (1, 0.05))
+
+# How far, in degrees, generated rooms scatter around their neighbourhood
+JITTER = 0.012
+
+BATCH_SIZE = 1000
+
+
+def _choose(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def _overlaps(taken, start, end):
+    return any(start <= other_end and other_start <= end for other_start, other_end in taken)
+
+
+def generate(users=1000, rooms=2000, bookings=10000, reviews=4000, seed=42, today=None):
+    """Add a reproducible synthetic data set to the database.
+
+    The same seed always produces the same rows. Popularity is skewed:
+    a few owners list most rooms, and a few rooms get most bookings and
+    reviews. Some booking requests overlap earlier ones; those end up
+    rejected or cancelled, so only pending and confirmed bookings hold
+    dates, as in production. Returns the number of rows added per table.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    now = datetime.combine(today, datetime.min.time())
+    password_hash = hash_password(PASSWORD)
+
+    first_id = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+    owner_count = max(1, users // 10)
+    user_rows = []
+    for offset in range(users):
+        number = first_id + offset
+        role = 'owner' if offset < owner_count else 'viewer'
+        user_rows.append({
+            'id': number, 'name': f'{role.title()} {number}', 'email': f'{role}{number}@example.com',
+            'phone': f'98{rng.randrange(10 ** 8):08d}', 'password_hash': password_hash, 'role': role,
+            'created_at': now - timedelta(days=rng.randrange(730)),
+        })
+    _insert(User, user_rows)
+    record_new_rows(db.session.connection(), User, user_rows)
+    owner_ids = [row['id'] for row in user_rows[:owner_count]]
+    viewer_ids = [row['id'] for row in user_rows[owner_count:]] or owner_ids
+
+    # Pareto weights give a long tail: most owners list one or two rooms
+    owner_weights = [rng.paretovariate(1.2) for _ in owner_ids]
+    # Coordinates come from their own generator so the rest of the data
+    # set stays the same as before rooms had them
+    geo_rng = random.Random(seed)
+    first_room_id = (db.session.scalar(select(func.max(Room.id))) or 0) + 1
+    room_rows = []
+    for offset in range(rooms):
+        room_type = rng.choice(list(ROOM_TYPES))
+        location = rng.choice(LOCATIONS)
+        created_at = now - timedelta(days=rng.randrange(365), minutes=rng.randrange(24 * 60))
+        available_from = today + timedelta(days=rng.randrange(-30, 60))
+        latitude, longitude = lookup_place(location)
+        room_rows.append({
+            'id': first_room_id + offset,
+            'owner_id': rng.choices(owner_ids, owner_weights)[0],
+            'title': f'{rng.choice(ADJECTIVES)} {room_type} in {location.split(",")[0]}',
+            'location': location,
+            'latitude': round(latitude + geo_rng.uniform(-JITTER, JITTER), 6),
+            'longitude': round(longitude + geo_rng.uniform(-JITTER, JITTER), 6),
+            'rent_price': float(round(ROOM_TYPES[room_type] * rng.lognormvariate(0, 0.3), -2)),
+            'room_type': room_type,
+            'description': f'{rng.choice(ADJECTIVES)} {room_type.lower()} near the main road. '
+                           f'Water and electricity included.',
+            'available_from': available_from,
+            'available_to': available_from + timedelta(days=rng.randrange(180, 720)) if rng.random() < 0.3 else None,
+            'status': _choose(rng, ROOM_STATUSES),
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    _insert(Room, room_rows)
+    # Bulk inserts skip the mapper events that maintain the search indexes
+    index_new_rooms(db.session.connection(), room_rows)
+    index_new_room_locations(db.session.connection(), room_rows)
+    record_new_rows(db.session.connection(), Room, room_rows)
+
+    approved = [row for row in room_rows if row['status'] == 'approved'] or room_rows
+    room_weights = [rng.paretovariate(1.1) for _ in approved]
+
+    first_booking_id = (db.session.scalar(select(func.max(Booking.id))) or 0) + 1
+    taken = {}
+    booking_rows = []
+    booked_rows = []
+    for offset in range(bookings):
+        room = rng.choices(approved, room_weights)[0]
+        start = today + timedelta(days=rng.randrange(-120, 180))
+        end = start + timedelta(days=rng.choice((1, 2, 3, 7, 14, 30, 30, 60)))
+        booking_id = first_booking_id + offset
+        held = taken.setdefault(room['id'], [])
+
+        if _overlaps(held, start, end):
+            status = rng.choice(('rejected', 'cancelled'))
+        else:
+            status = _choose(rng, BOOKING_OUTCOMES)
+            if status in ('pending', 'confirmed'):
+                held.append((start, end))
+                booked_rows.extend(
+                    {'room_id': room['id'], 'day': day, 'booking_id': booking_id}
+                    for day in days_between(start, end)
+                )
+
+        booking_rows.append({
+            'id': booking_id, 'room_id': room['id'], 'renter_id': rng.choice(viewer_ids),
+            'start_date': start, 'end_date': end, 'status': status,
+            'total_price': round((end - start).days * room['rent_price'] / 30),
+            'created_at': min(now, datetime.combine(start, datetime.min.time())) - timedelta(days=rng.randrange(1, 30)),
+        })
+    _insert(Booking, booking_rows)
+    record_new_rows(db.session.connection(), Booking, booking_rows)
+    record_new_bookings(db.session.connection(), booking_rows)
+    _insert(BookedDate, booked_rows)
+
+    review_rows = []
+    for _ in range(reviews):
+        room = rng.choices(approved, room_weights)[0]
+        review_rows.append({
+            'room_id': room['id'], 'reviewer_id': rng.choice(viewer_ids), 'rating': _choose(rng, RATINGS),
+            'comment': rng.choice(COMMENTS),
+            'created_at': room['created_at'] + timedelta(days=rng.randrange(1, 120)),
+        })
+    _insert(Review, review_rows)
+
+    refresh_aggregates()
+    db.session.commit()
+
+    return {'users': len(user_rows), 'rooms': len(room_rows), 'bookings': len(booking_rows),
+            'booked_dates': len(booked_rows), 'reviews': len(review_rows)}
+
+
+def refresh_aggregates():
+    """Recompute the denormalised rating and pending-booking columns from
+    scratch, for rows written without mapper events"""
+    reviews = Review.__table__
+    rooms = Room.__table__
+    bookings = Booking.__table__
+    users = User.__table__
+
+    db.session.execute(rooms.update().values(
+        rating_sum=select(func.coalesce(func.sum(reviews.c.rating), 0))
+        .where(reviews.c.room_id == rooms.c.id).scalar_subquery(),
+        rating_count=select(func.count(reviews.c.id))
+        .where(reviews.c.room_id == rooms.c.id).scalar_subquery(),
+    ))
+    db.session.execute(users.update().values(
+        pending_bookings_count=select(func.count(bookings.c.id))
+        .select_from(bookings.join(rooms, rooms.c.id == bookings.c.room_id))
+        .where(rooms.c.owner_id == users.c.id, bookings.c.status == 'pending')
+        .scalar_subquery()
+    ))
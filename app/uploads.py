@@ -0,0 +1,138 @@
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app import metrics
+from app.models import Room, User
+
+try:
+    import fcntl
+except ImportError:  # Windows; only a single-process server is safe there
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Stored uploads are named after the SHA-256 of their content. Anything
+# else in the upload folder (site icons, defaults, legacy uploads) is
+# never deleted by this module.
+STORED_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+# Fallback images that models, routes and templates refer to by name
+DEFAULT_IMAGES = {'default_room.jpg', 'default-user.jpg'}
+
+_thread_lock = threading.Lock()
+
+
+def upload_folder():
+    return os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+
+
+def file_extension(filename):
+    filename = secure_filename(filename or '')
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stored_name(digest, extension):
+    return f'{digest}.{extension}' if extension else digest
+
+
+@contextmanager
+def upload_lock():
+    """Serialise taking and dropping references to stored uploads.
+
+    Hold it from save_upload() until the row naming the file is committed,
+    so release_upload(), which takes it too, cannot delete a file that a
+    concurrent request has just reused. A lock file in the upload folder
+    makes it hold across worker processes.
+    """
+    if fcntl is None:
+        with _thread_lock:
+            yield
+        return
+    with open(os.path.join(upload_folder(), '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def save_upload(file):
+    """Store an uploaded FileStorage by content hash and return its filename.
+
+    The upload is copied to a temporary file in chunks while it is hashed,
+    so it is never held in memory. If the same content is already stored,
+    the copy is discarded and the existing file is reused. Call it inside
+    upload_lock() and commit the reference before leaving it.
+    """
+    folder = upload_folder()
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        filename = stored_name(digest.hexdigest(), file_extension(file.filename))
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    metrics.inc('uploads_total')
+    metrics.inc('upload_bytes_total', size)
+    return filename
+
+
+def reference_count(filename):
+    """How many rooms and users currently point at filename"""
+    return (
+        Room.query.filter_by(image_filename=filename).count()
+        + User.query.filter_by(profile_image=filename).count()
+    )
+
+
+def remove_with_variants(folder, filename):
+    stem = os.path.splitext(filename)[0]
+    paths = [os.path.join(folder, filename)]
+    paths += glob.glob(os.path.join(folder, glob.escape(stem) + '_*.webp'))
+    paths += glob.glob(os.path.join(folder, glob.escape(stem) + '_*.jpg'))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def release_upload(filename):
+    """Delete a stored upload and its variants once nothing references it.
+
+    Call after the change that dropped the reference has been committed,
+    outside upload_lock(); the check and the delete happen under it.
+    """
+    if not filename or not STORED_NAME.match(filename):
+        return False
+    with upload_lock():
+        if reference_count(filename):
+            return False
+        remove_with_variants(upload_folder(), filename)
+    return True
@@ -4,6 +4,85 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read-only copy of the database used by read_only views
+    SQLALCHEMY_BINDS = {'replica': os.environ['REPLICA_DATABASE_URL']} if os.environ.get('REPLICA_DATABASE_URL') else {}
+    # Pool settings; unset ones keep SQLAlchemy's defaults for the driver
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        option: int(os.environ[variable])
+        for option, variable in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                                 ('pool_timeout', 'DB_POOL_TIMEOUT'), ('pool_recycle', 'DB_POOL_RECYCLE'))
+        if os.environ.get(variable)
+    }
+    # Applied to every SQLite connection when it is opened. WAL lets readers
+    # run alongside the single writer, and busy_timeout makes a writer wait
+    # for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE') or 'wal',
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS') or 'normal',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+        # Negative means KiB rather than pages
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 64 * 1024),
+    }
     UPLOAD_FOLDER = 'app/static/images'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    # Any werkzeug generate_password_hash method, e.g. 'pbkdf2:sha256:600000'
+    # or 'scrypt:32768:8:1'. Existing hashes are upgraded on next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = 16
+    # Most password hashes and checks running at once; 0 for no limit
+    PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS') or os.cpu_count() or 2)
+    # Seconds a request waits for one of them before it gets a 503
+    PASSWORD_WAIT_TIMEOUT = float(os.environ.get('PASSWORD_WAIT_TIMEOUT') or 2)
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 20)
+    # Pending rooms per page on the admin panel, all selectable at once
+    MODERATION_PAGE_SIZE = int(os.environ.get('MODERATION_PAGE_SIZE') or 100)
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+
+    # 'memory' (per process), 'sqlite' (shared by all workers) or 'none'
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE') or 'memory'
+    RESPONSE_CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 300)
+    RESPONSE_CACHE_MAX_ENTRIES = 512
+    RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+    # Server-Timing headers and a slow query log; PROFILE_SAMPLE_RATE = N
+    # also saves a cProfile of one request in N (0 disables sampling)
+    PROFILING = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS') or 100)
+    PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE') or 0)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+    # Prometheus /metrics. With several worker processes set METRICS_DIR to
+    # a directory they all share so the endpoint reports their totals.
+    METRICS = os.environ.get('METRICS', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 1.0)
+
+    # Users looked up by the login loader; same backend choices as above
+    USER_CACHE = os.environ.get('USER_CACHE') or 'memory'
+    USER_CACHE_PATH = os.environ.get('USER_CACHE_PATH')
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_MAX_ENTRIES = 4096
+
+    # Outgoing mail, sent by flask jobs worker rather than during requests
+    MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'localhost'
+    MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '').lower() in ('1', 'true', 'yes')
+    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL', '').lower() in ('1', 'true', 'yes')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'Room Rental System <noreply@localhost>'
+    # Where links in emails point, since they are rendered outside a request
+    SITE_URL = os.environ.get('SITE_URL') or 'http://localhost:5000'
+
+    # Background jobs. A failed job is retried after JOB_RETRY_DELAY
+    # seconds, doubling each time up to JOB_RETRY_MAX_DELAY. A job still
+    # running after JOB_LOCK_TIMEOUT seconds is assumed to have lost its
+    # worker and is run again.
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 1.0)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)
+    JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY') or 30)
+    JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY') or 3600)
+    JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT') or 600)
@@ -51,6 +51,18 @@ def get_metadata():
     return target_db.metadata
 
 
+# Created with raw SQL by app.search and app.geo rather than by the models.
+# SQLite adds shadow tables named after each one (rooms_fts_data,
+# rooms_rtree_node, ...); autogenerate must not propose dropping any of them.
+UNMANAGED_TABLES = ('rooms_fts', 'rooms_rtree')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and compare_to is None:
+        return not any(name == table or name.startswith(table + '_') for table in UNMANAGED_TABLES)
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +77,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +106,8 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
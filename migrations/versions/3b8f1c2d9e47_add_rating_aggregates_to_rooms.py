@@ -0,0 +1,71 @@
+"""Add rating_sum and rating_count to Room
+
+Revision ID: 3b8f1c2d9e47
+Revises: 0407e2d33e3d
+Create Date: 2026-10-17 09:12:44.201733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8f1c2d9e47'
+down_revision = '0407e2d33e3d'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+rooms = sa.table(
+    'rooms',
+    sa.column('id', sa.Integer),
+    sa.column('rating_sum', sa.Integer),
+    sa.column('rating_count', sa.Integer),
+)
+reviews = sa.table(
+    'reviews',
+    sa.column('room_id', sa.Integer),
+    sa.column('rating', sa.Integer),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing reviews, one batch of rooms at a time so the
+    # aggregate query never has to hold the whole reviews table.
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        room_ids = bind.execute(
+            sa.select(rooms.c.id)
+            .where(rooms.c.id > last_id)
+            .order_by(rooms.c.id)
+            .limit(BATCH_SIZE)
+        ).scalars().all()
+        if not room_ids:
+            break
+
+        totals = bind.execute(
+            sa.select(reviews.c.room_id, sa.func.sum(reviews.c.rating), sa.func.count())
+            .where(reviews.c.room_id.in_(room_ids))
+            .group_by(reviews.c.room_id)
+        ).all()
+        if totals:
+            bind.execute(
+                rooms.update()
+                .where(rooms.c.id == sa.bindparam('b_room_id'))
+                .values(rating_sum=sa.bindparam('b_sum'), rating_count=sa.bindparam('b_count')),
+                [{'b_room_id': room_id, 'b_sum': total, 'b_count': count} for room_id, total, count in totals]
+            )
+
+        last_id = room_ids[-1]
+
+
+def downgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_sum')
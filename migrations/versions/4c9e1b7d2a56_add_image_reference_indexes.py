@@ -0,0 +1,25 @@
+"""Index the image columns that stored uploads are reference-counted by
+
+Revision ID: 4c9e1b7d2a56
+Revises: b7d3e9a1c468
+Create Date: 2026-10-17 20:14:07.530418
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9e1b7d2a56'
+down_revision = 'b7d3e9a1c468'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_rooms_image_filename', 'rooms', ['image_filename'], unique=False)
+    op.create_index('ix_users_profile_image', 'users', ['profile_image'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_profile_image', table_name='users')
+    op.drop_index('ix_rooms_image_filename', table_name='rooms')
@@ -0,0 +1,36 @@
+"""Add rooms_fts full-text index
+
+Revision ID: 5e2a7d4c1f90
+Revises: 3b8f1c2d9e47
+Create Date: 2026-10-17 10:03:27.914512
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2a7d4c1f90'
+down_revision = '3b8f1c2d9e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rooms_fts USING fts5("
+        "title, location, description, tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO rooms_fts (rowid, title, location, description) "
+        "SELECT id, title, location, COALESCE(description, '') FROM rooms WHERE status = 'approved'"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TABLE IF EXISTS rooms_fts")
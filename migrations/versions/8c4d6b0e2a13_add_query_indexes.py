@@ -0,0 +1,31 @@
+"""Add composite indexes for room, booking and review lookups
+
+Revision ID: 8c4d6b0e2a13
+Revises: 5e2a7d4c1f90
+Create Date: 2026-10-17 10:41:05.337290
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4d6b0e2a13'
+down_revision = '5e2a7d4c1f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_rooms_status_created_at', 'rooms', ['status', 'created_at'], unique=False)
+    op.create_index('ix_rooms_owner_id', 'rooms', ['owner_id'], unique=False)
+    op.create_index('ix_bookings_room_status_dates', 'bookings', ['room_id', 'status', 'start_date', 'end_date'], unique=False)
+    op.create_index('ix_bookings_renter_id', 'bookings', ['renter_id'], unique=False)
+    op.create_index('ix_reviews_room_created_at', 'reviews', ['room_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_reviews_room_created_at', table_name='reviews')
+    op.drop_index('ix_bookings_renter_id', table_name='bookings')
+    op.drop_index('ix_bookings_room_status_dates', table_name='bookings')
+    op.drop_index('ix_rooms_owner_id', table_name='rooms')
+    op.drop_index('ix_rooms_status_created_at', table_name='rooms')
@@ -0,0 +1,45 @@
+"""Add latitude and longitude to Room, with an R*Tree index
+
+Revision ID: a6e3c9d2b157
+Revises: f4d1a6c3b972
+Create Date: 2026-10-17 16:42:08.513207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e3c9d2b157'
+down_revision = 'f4d1a6c3b972'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    # Existing rooms have no coordinates yet; flask rooms geocode fills
+    # them in and the mapper events index them as they are saved
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rooms_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+    )
+    op.execute(
+        "INSERT INTO rooms_rtree (id, min_lat, max_lat, min_lng, max_lng) "
+        "SELECT id, latitude, latitude, longitude, longitude FROM rooms "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS rooms_rtree")
+
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Add booked_dates occupancy table
+
+Revision ID: b71e9a3f5c28
+Revises: 8c4d6b0e2a13
+Create Date: 2026-10-17 11:26:51.480917
+
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e9a3f5c28'
+down_revision = '8c4d6b0e2a13'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+bookings = sa.table(
+    'bookings',
+    sa.column('id', sa.Integer),
+    sa.column('room_id', sa.Integer),
+    sa.column('start_date', sa.Date),
+    sa.column('end_date', sa.Date),
+    sa.column('status', sa.String),
+)
+
+
+def upgrade():
+    booked_dates = op.create_table(
+        'booked_dates',
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('booking_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['booking_id'], ['bookings.id'], ),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ),
+        sa.PrimaryKeyConstraint('room_id', 'day')
+    )
+    op.create_index('ix_booked_dates_booking_id', 'booked_dates', ['booking_id'], unique=False)
+
+    # Existing data may already contain double bookings; the oldest
+    # booking keeps a contested day and later ones simply don't hold it.
+    bind = op.get_bind()
+    result = bind.execute(
+        sa.select(bookings.c.id, bookings.c.room_id, bookings.c.start_date, bookings.c.end_date)
+        .where(bookings.c.status.in_(['pending', 'confirmed']))
+        .order_by(bookings.c.room_id, bookings.c.id)
+    )
+    taken = set()
+    current_room = None
+    rows = []
+    for booking_id, room_id, start_date, end_date in result:
+        if room_id != current_room:
+            taken.clear()
+            current_room = room_id
+        day = start_date
+        while day <= end_date:
+            if day not in taken:
+                taken.add(day)
+                rows.append({'room_id': room_id, 'day': day, 'booking_id': booking_id})
+            day += timedelta(days=1)
+        if len(rows) >= BATCH_SIZE:
+            op.bulk_insert(booked_dates, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(booked_dates, rows)
+
+
+def downgrade():
+    op.drop_index('ix_booked_dates_booking_id', table_name='booked_dates')
+    op.drop_table('booked_dates')
@@ -0,0 +1,39 @@
+"""Add room_monthly_stats
+
+Fill it from existing bookings with flask bookings rollup after upgrading.
+
+Revision ID: b7d3e9a1c468
+Revises: e8b4d2f6a913
+Create Date: 2026-10-17 19:26:41.905132
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e9a1c468'
+down_revision = 'e8b4d2f6a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'room_monthly_stats',
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('nights', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('bookings', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ),
+        sa.PrimaryKeyConstraint('room_id', 'month')
+    )
+    op.create_index('ix_room_monthly_stats_owner_month', 'room_monthly_stats', ['owner_id', 'month'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_room_monthly_stats_owner_month', table_name='room_monthly_stats')
+    op.drop_table('room_monthly_stats')
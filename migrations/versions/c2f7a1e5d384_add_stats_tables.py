@@ -0,0 +1,50 @@
+"""Add stat_counters and daily_stats
+
+Revision ID: c2f7a1e5d384
+Revises: a6e3c9d2b157
+Create Date: 2026-10-17 17:35:52.640918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f7a1e5d384'
+down_revision = 'a6e3c9d2b157'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stat_counters',
+        sa.Column('name', sa.String(length=60), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table(
+        'daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('name', sa.String(length=60), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'name')
+    )
+
+    # Start the counters from what is already there
+    for table, column in (('users', 'role'), ('rooms', 'status'), ('bookings', 'status')):
+        op.execute(
+            f"INSERT INTO stat_counters (name, value) "
+            f"SELECT '{table}.' || {column}, COUNT(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}"
+        )
+    for table, name in (('users', 'new_users'), ('rooms', 'new_rooms'), ('bookings', 'new_bookings')):
+        op.execute(
+            f"INSERT INTO daily_stats (day, name, value) "
+            f"SELECT DATE(created_at), '{name}', COUNT(*) FROM {table} "
+            f"WHERE created_at IS NOT NULL GROUP BY DATE(created_at)"
+        )
+
+
+def downgrade():
+    op.drop_table('daily_stats')
+    op.drop_table('stat_counters')
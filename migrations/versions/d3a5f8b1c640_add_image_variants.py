@@ -0,0 +1,32 @@
+"""Add image variant columns to Room and User
+
+Revision ID: d3a5f8b1c640
+Revises: b71e9a3f5c28
+Create Date: 2026-10-17 12:18:36.052194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a5f8b1c640'
+down_revision = 'b71e9a3f5c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile_image_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('profile_image_variants')
+
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
@@ -0,0 +1,32 @@
+"""Add pending_bookings_count to User
+
+Revision ID: e9c2b7a4d815
+Revises: d3a5f8b1c640
+Create Date: 2026-10-17 14:02:11.618390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c2b7a4d815'
+down_revision = 'd3a5f8b1c640'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pending_bookings_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute(
+        "UPDATE users SET pending_bookings_count = ("
+        "SELECT COUNT(bookings.id) FROM bookings JOIN rooms ON rooms.id = bookings.room_id "
+        "WHERE rooms.owner_id = users.id AND bookings.status = 'pending')"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('pending_bookings_count')
@@ -0,0 +1,28 @@
+"""Add updated_at to Room
+
+Revision ID: f4d1a6c3b972
+Revises: e9c2b7a4d815
+Create Date: 2026-10-17 15:21:47.290318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d1a6c3b972'
+down_revision = 'e9c2b7a4d815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute('UPDATE rooms SET updated_at = created_at')
+
+
+def downgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
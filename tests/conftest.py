@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from app import create_app, db, synthetic
+from app.benchmark import scenario_data
+from app.models import User, Room
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+        SQLALCHEMY_BINDS = {}
+        UPLOAD_FOLDER = str(tmp_path)
+        RESPONSE_CACHE = 'none'
+        USER_CACHE = 'none'
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+        PASSWORD_WORKERS = 0
+        IMAGE_WORKERS = 0
+        METRICS = False
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_user(role, email, name='Test User'):
+    user = User(name=name, email=email, phone='9800000000', role=role)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def add_room(owner, rent_price, status='approved', room_type='Single Room', **fields):
+    room = Room(owner_id=owner.id, title=fields.pop('title', f'Room at {rent_price}'),
+                location=fields.pop('location', 'Thamel, Kathmandu'), rent_price=rent_price,
+                room_type=room_type, description='A room', available_from=date.today(),
+                status=status, **fields)
+    db.session.add(room)
+    db.session.commit()
+    return room
+
+
+def login(client, email):
+    return client.post('/login', data={'email': email, 'password': 'password123'})
+
+
+@pytest.fixture
+def seeded(app):
+    """Thousands of synthetic rows, and (room_id, viewer, owner, admin) to
+    request pages with; every account's password is 'password123'"""
+    synthetic.generate(users=500, rooms=2000, bookings=5000, reviews=2000)
+    _, room_ids, viewer, owner = scenario_data(seed=1)
+    add_user('admin', 'admin@example.com')
+    return room_ids[0], viewer, owner, 'admin@example.com'
+
+
+def fetch(app, client, path, method='GET', data=None):
+    """A request in an app context of its own, as in production.
+
+    Requests made straight from a test share the fixture's context, so
+    g, and with it the logged-in user, carries over between them.
+    """
+    with app.app_context():
+        return client.open(path, method=method, data=data)
+
+
+@contextmanager
+def recorded_statements():
+    """A list that collects (statement, parameters) for every SQL
+    statement run on the primary engine inside the block"""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from app import db, response_cache
+from app.models import Booking, BookedDate
+from tests.conftest import add_user, add_room, fetch, login
+
+RENTERS = 20
+ATTEMPTS = 200
+
+
+def test_parallel_bookings_have_one_winner_per_range(app):
+    owner = add_user('owner', 'owner@example.com')
+    room_id = add_room(owner, 9000).id
+    clients = []
+    for number in range(RENTERS):
+        add_user('viewer', f'renter{number}@example.com')
+        clients.append(app.test_client())
+
+    # Four separate fortnights; every attempt overlaps exactly one of them
+    first = date.today() + timedelta(days=7)
+    ranges = [(first + timedelta(days=20 * index), first + timedelta(days=20 * index + 14)) for index in range(4)]
+
+    def attempt(number):
+        start, end = ranges[number % len(ranges)]
+        shift = timedelta(days=number % 3)
+        response = clients[number % RENTERS].post(f'/book/{room_id}', data={
+            'start_date': (start + shift).isoformat(), 'end_date': (end - shift).isoformat(),
+        })
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=RENTERS) as executor:
+        # Off this thread, where the fixture's app context would keep the first login in g
+        logins = executor.map(lambda number: login(clients[number], f'renter{number}@example.com'), range(RENTERS))
+        assert all(response.location == '/dashboard' for response in logins)
+        statuses = list(executor.map(attempt, range(ATTEMPTS)))
+
+    assert set(statuses) <= {200, 302}
+    assert statuses.count(302) == len(ranges)
+
+    db.session.expire_all()
+    bookings = Booking.query.filter(Booking.status.in_(('pending', 'confirmed'))).all()
+    for start, end in ranges:
+        assert len([booking for booking in bookings
+                    if booking.start_date <= end and booking.end_date >= start]) == 1
+
+    days = db.session.execute(db.select(BookedDate.room_id, BookedDate.day)).all()
+    assert len(days) == len(set(days)) == sum((booking.end_date - booking.start_date).days + 1
+                                               for booking in bookings)
+
+
+def test_booking_changes_refresh_cached_availability(app):
+    app.config['RESPONSE_CACHE'] = 'memory'
+    response_cache.init_app(app)
+    room_id = add_room(add_user('owner', 'owner@example.com'), 9000).id
+    add_user('viewer', 'renter@example.com')
+    visitor, renter = app.test_client(), app.test_client()
+    fetch(app, renter, '/login', 'POST', {'email': 'renter@example.com', 'password': 'password123'})
+
+    def available_rooms():
+        page = fetch(app, visitor, '/rooms?available=1').get_data(as_text=True)
+        return page.count('class="room-card"')
+
+    assert available_rooms() == 1
+    today = date.today()
+    fetch(app, renter, f'/book/{room_id}', 'POST',
+          {'start_date': today.isoformat(), 'end_date': (today + timedelta(days=3)).isoformat()})
+    assert available_rooms() == 0
+
+    booking_id = db.session.scalar(db.select(Booking.id))
+    fetch(app, renter, f'/cancel_booking/{booking_id}')
+    assert available_rooms() == 1
@@ -0,0 +1,48 @@
+import html
+import re
+from app.facets import facet_counts
+from app.models import Room
+from tests.conftest import add_user, add_room
+
+
+def add_edge_rooms():
+    owner = add_user('owner', 'owner@example.com')
+    for rent in (5000, 10000, 15000, 20000):
+        add_room(owner, rent)
+
+
+def test_price_buckets_count_each_room_once(app):
+    add_edge_rooms()
+    facets = facet_counts(Room.query.filter_by(status='approved'))
+
+    assert facets['total'] == 4
+    assert sum(bucket['count'] for bucket in facets['price']) == facets['total']
+    counts = {(bucket['min'], bucket['max']): bucket['count'] for bucket in facets['price']}
+    assert counts[(None, 5000)] == 0
+    assert counts[(5000, 10000)] == 1
+    assert counts[(20000, 30000)] == 1
+
+
+def test_room_list_with_price_arguments(client):
+    add_edge_rooms()
+
+    for query in ('min_price=5000', 'max_price=10000', 'min_price=5000&max_price=10000', 'min_price=&max_price=5000'):
+        response = client.get(f'/rooms?{query}')
+        assert response.status_code == 200, query
+
+    page = client.get('/rooms?min_price=5000&max_price=10000').get_data(as_text=True)
+    assert '2 rooms found' in page
+    assert 'facet active' not in page
+
+
+def test_price_bucket_link_returns_its_count(client):
+    add_edge_rooms()
+    page = client.get('/rooms').get_data(as_text=True)
+    buckets = re.findall(r'<a href="([^"]*)"\s+class="facet[^"]*">.*?<span class="facet-count">(\d+)</span>', page, re.S)
+    assert len(buckets) == 6
+
+    for url, count in buckets:
+        results = client.get(html.unescape(url)).get_data(as_text=True)
+        assert results.count('class="room-card"') == int(count), url
+        assert f'{count} room' in results
+        assert results.count('facet active') == 1
@@ -0,0 +1,143 @@
+import socket
+import socketserver
+import threading
+from datetime import date, datetime, timedelta
+import pytest
+from app import db, jobs
+from app.models import Booking, Job
+from tests.conftest import add_user, add_room, login
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib to hand over a message"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost')
+        envelope = {'to': []}
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'RCPT':
+                envelope['to'].append(line.split(':', 1)[1].strip(' <>'))
+            if command == 'DATA':
+                self.reply('354 go ahead')
+                data = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line == b'.\r\n':
+                        break
+                    data.append(data_line.decode())
+                self.server.messages.append((envelope['to'], ''.join(data)))
+                envelope = {'to': []}
+            self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp(app):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.messages = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config['SITE_URL'] = 'https://rooms.example'
+    app.extensions['mail'].server = '127.0.0.1'
+    app.extensions['mail'].port = server.server_address[1]
+    app.extensions['mail'].suppress = False
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request_booking(client):
+    owner = add_user('owner', 'owner@example.com', name='Owner')
+    add_user('viewer', 'renter@example.com', name='Renter')
+    room = add_room(owner, 9000)
+    login(client, 'renter@example.com')
+    start = date.today() + timedelta(days=3)
+    response = client.post(f'/book/{room.id}', data={'start_date': start.isoformat(),
+                                                     'end_date': (start + timedelta(days=10)).isoformat()})
+    assert response.status_code == 302
+    return db.session.scalars(db.select(Booking)).one()
+
+
+def test_booking_request_is_mailed_by_the_worker(app, client, smtp):
+    booking = request_booking(client)
+    job = db.session.scalars(db.select(Job)).one()
+    assert (job.name, job.key, job.status) == ('booking_requested', f'booking-requested:{booking.id}', 'queued')
+    assert smtp.messages == []
+
+    assert jobs.work(app, burst=True) == 1
+
+    recipients, message = smtp.messages[0]
+    assert recipients == ['owner@example.com']
+    assert 'https://rooms.example/owner/bookings' in message
+    db.session.expire_all()
+    assert db.session.get(Job, job.id).status == 'done'
+
+
+def test_single_room_approval_is_mailed_to_the_owner(app, client, smtp):
+    owner = add_user('owner', 'owner@example.com', name='Owner')
+    add_user('admin', 'admin@example.com')
+    room_id = add_room(owner, 9000, status='pending', title='Sunny room').id
+    login(client, 'admin@example.com')
+
+    assert client.get(f'/approve/{room_id}').status_code == 302
+    # Approving it again changes nothing and sends nothing
+    client.get(f'/approve/{room_id}')
+    assert jobs.work(app, burst=True) == 1
+
+    recipients, message = smtp.messages[0]
+    assert recipients == ['owner@example.com']
+    assert 'Sunny room' in message
+
+
+def test_failed_send_is_retried_with_backoff_then_given_up(app, client):
+    app.config.update(JOB_RETRY_DELAY=60, JOB_MAX_ATTEMPTS=2)
+    app.extensions['mail'].suppress = False
+    app.extensions['mail'].server = '127.0.0.1'
+    app.extensions['mail'].port = unused_port()
+    request_booking(client)
+
+    assert jobs.work(app, burst=True) == 1
+    db.session.expire_all()
+    job = db.session.scalars(db.select(Job)).one()
+    assert (job.status, job.attempts) == ('queued', 1)
+    assert job.run_at > datetime.utcnow() + timedelta(seconds=30)
+    assert 'ConnectionRefusedError' in job.last_error
+
+    # Not due yet
+    assert jobs.work(app, burst=True) == 0
+    job.run_at = datetime.utcnow()
+    db.session.commit()
+    assert jobs.work(app, burst=True) == 1
+    db.session.expire_all()
+    job = db.session.get(Job, job.id)
+    assert (job.status, job.attempts) == ('failed', 2)
+
+
+def test_enqueue_with_the_same_key_is_a_no_op(app):
+    jobs.enqueue('booking_requested', {'booking_id': 1}, key='booking-requested:1')
+    jobs.enqueue('booking_requested', {'booking_id': 1}, key='booking-requested:1')
+    db.session.commit()
+    assert db.session.scalar(db.select(db.func.count(Job.id))) == 1
+
+
+def test_job_of_a_dead_worker_is_claimed_again(app):
+    jobs.enqueue('booking_requested', {'booking_id': 1})
+    db.session.commit()
+    job = jobs.claim('dead-worker')
+    assert jobs.claim('other-worker') is None
+
+    db.session.execute(db.update(Job).values(locked_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    reclaimed = jobs.claim('other-worker')
+    assert (reclaimed['id'], reclaimed['attempts']) == (job['id'], 2)
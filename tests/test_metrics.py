@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from app.metrics import EXITED_FILE, Metrics
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_worker_file(directory, name, requests):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump({
+            'counters': [['http_requests_total', [['endpoint', 'index']], requests]],
+            'histograms': [],
+            'gauges': [['http_requests_in_flight', [], 1]],
+        }, f)
+
+
+def test_exited_workers_are_folded_and_never_lost(tmp_path):
+    metrics = Metrics()
+    metrics.directory = str(tmp_path)
+    metrics.inc('http_requests_total', endpoint='index')
+    key = ('http_requests_total', (('endpoint', 'index'),))
+    in_flight = ('http_requests_in_flight', ())
+
+    write_worker_file(tmp_path, f'metrics-{exited_pid()}-abc.json', 10)
+    # Left by an earlier process that had this process's pid
+    write_worker_file(tmp_path, f'metrics-{os.getpid()}-old.json', 5)
+    write_worker_file(tmp_path, f'metrics-{os.getppid()}-live.json', 100)
+
+    counters, _, gauges = metrics.collect()
+    assert counters[key] == 116
+    assert gauges[in_flight] == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([EXITED_FILE, '.lock', f'metrics-{os.getppid()}-live.json'])
+
+    metrics.flush()
+    write_worker_file(tmp_path, f'metrics-{exited_pid()}-def.json', 20)
+    counters, _, _ = metrics.collect()
+    assert counters[key] == 136
+    assert metrics.collect()[0][key] == 136
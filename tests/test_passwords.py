@@ -0,0 +1,18 @@
+from app.passwords import get_slots
+from tests.conftest import add_user, login
+
+
+def test_login_gets_503_while_hashing_is_saturated(app, client):
+    add_user('viewer', 'renter@example.com')
+    app.config.update(PASSWORD_WORKERS=1, PASSWORD_WAIT_TIMEOUT=0.05)
+    slots = get_slots(1)
+
+    assert slots.acquire(blocking=False)
+    try:
+        response = login(client, 'renter@example.com')
+    finally:
+        slots.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+    assert login(client, 'renter@example.com').location == '/dashboard'
@@ -0,0 +1,43 @@
+from sqlalchemy import func, select
+from app import db
+from app.models import User, Booking
+from tests.conftest import fetch, recorded_statements
+
+# Most SQL statements one request may run, whatever the number of rows.
+# Loading a relationship per row from a template blows these at once.
+BUDGETS = {
+    (None, '/'): 1,
+    (None, '/rooms'): 2,
+    (None, '/rooms?location=Thamel&available=1'): 2,
+    (None, '/room/{room_id}'): 3,
+    ('viewer', '/dashboard'): 2,
+    ('viewer', '/view_room/{booked_room_id}'): 5,
+    ('viewer', '/book/{room_id}'): 3,
+    ('owner', '/dashboard'): 2,
+    ('owner', '/owner/bookings'): 2,
+    ('owner', '/owner/analytics'): 3,
+    ('admin', '/dashboard'): 4,
+}
+
+
+def test_routes_stay_within_query_budget(app, seeded):
+    room_id, _, owner, admin = seeded
+    # The renter with the most bookings is the worst case for the dashboard
+    viewer, booked_room_id = db.session.execute(
+        select(User.email, func.min(Booking.room_id)).join(Booking, Booking.renter_id == User.id)
+        .group_by(User.id).order_by(func.count(Booking.id).desc()).limit(1)
+    ).one()
+    clients = {None: app.test_client()}
+    for role, email in (('viewer', viewer), ('owner', owner), ('admin', admin)):
+        clients[role] = app.test_client()
+        fetch(app, clients[role], '/login', 'POST', {'email': email, 'password': 'password123'})
+
+    over = []
+    for (role, path), budget in BUDGETS.items():
+        path = path.format(room_id=room_id, booked_room_id=booked_room_id)
+        with recorded_statements() as statements:
+            response = fetch(app, clients[role], path)
+        assert response.status_code == 200, (role, path)
+        if len(statements) > budget:
+            over.append(f'{role or "anonymous"} {path}: {len(statements)} statements, budget {budget}')
+    assert over == []
@@ -0,0 +1,53 @@
+import re
+from datetime import date, timedelta
+from app import db
+from tests.conftest import fetch, recorded_statements
+
+# SCAN without an index reads the whole table
+SCAN = re.compile(r'\bSCAN (\w+)')
+INDEXED = ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'USING PRIMARY KEY')
+
+
+def table_scans(statements):
+    """(table, statement) for each statement whose plan reads a whole table"""
+    scans = set()
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            continue
+        for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+            detail = row[-1]
+            match = SCAN.search(detail)
+            if match and match.group(1) in db.metadata.tables and not any(how in detail for how in INDEXED):
+                scans.add((match.group(1), statement))
+    return scans
+
+
+def test_routes_do_not_scan_tables(app, seeded):
+    room_id, viewer, owner, _ = seeded
+    start = date.today() + timedelta(days=400)
+    booking = {'start_date': start.isoformat(), 'end_date': (start + timedelta(days=3)).isoformat()}
+    anonymous, renter, landlord = app.test_client(), app.test_client(), app.test_client()
+    fetch(app, renter, '/login', 'POST', {'email': viewer, 'password': 'password123'})
+    fetch(app, landlord, '/login', 'POST', {'email': owner, 'password': 'password123'})
+
+    requests = [
+        (anonymous, '/', 'GET', None),
+        (anonymous, '/rooms', 'GET', None),
+        (anonymous, '/rooms?room_type=Apartment&max_price=30000&available=1', 'GET', None),
+        (anonymous, f'/room/{room_id}', 'GET', None),
+        (renter, '/dashboard', 'GET', None),
+        (renter, f'/book/{room_id}', 'GET', None),
+        (renter, f'/book/{room_id}', 'POST', booking),
+        (landlord, '/dashboard', 'GET', None),
+        (landlord, '/owner/bookings', 'GET', None),
+        (landlord, '/owner/analytics', 'GET', None),
+    ]
+    with recorded_statements() as statements:
+        for client, path, method, data in requests:
+            response = fetch(app, client, path, method, data)
+            assert response.status_code in (200, 302), path
+            assert '/login' not in (response.location or ''), path
+
+    assert len(statements) > len(requests)
+    assert table_scans(statements) == set()